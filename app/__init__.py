@@ -1,14 +1,52 @@
-from fastapi import FastAPI
+import asyncio, time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy_utils import create_database, database_exists
 from app.routers import *
-from app.utils.database import Base, engine
+from app.lib.admission import admission
+from app.lib.downloader import media_downloader
+from app.lib.metrics import HTTP_REQUEST_LATENCY, instrument_pool
+from app.lib.response_cache import response_cache
+from app.lib.token_cache import token_cache
+from app.lib.suno_pool import suno_pool
+from app.services.ingest_service import ingest_pipeline
+from app.services.job_service import job_runner
+from app.services.log_service import log_writer
+from app.services.rollup_service import usage_rollup
+from app.services.song_service import backfill_song_counts
+from app.utils.database import async_engine
+from app.utils.migrations import run_migrations
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 建库并升级到最新迁移版本
+    await asyncio.to_thread(run_migrations)
+    await backfill_song_counts()
+    await log_writer.start()
+    await suno_pool.start()
+    await ingest_pipeline.start()
+    await job_runner.start()
+    await usage_rollup.start()
+    yield
+    await usage_rollup.stop()
+    await job_runner.stop()
+    await ingest_pipeline.stop()
+    # 关闭各账号的 Suno 连接池
+    await suno_pool.stop()
+    await media_downloader.close()
+    await response_cache.close()
+    await token_cache.close()
+    await admission.close()
+    # 落盘缓冲中的审计日志
+    await log_writer.stop()
+    await async_engine.dispose()
 
 def create_app():
     app = FastAPI(
         title="Template FastAPI Server",
         description="A sample API for universal template.",
         version="1.0.0",
+        lifespan=lifespan,
     )
     # Configure CORS
     app.add_middleware(
@@ -19,15 +57,29 @@ def create_app():
         allow_headers=["*"],
     )
 
+    # 按路由模板统计请求耗时
+    @app.middleware("http")
+    async def record_latency(request: Request, call_next):
+        start = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            HTTP_REQUEST_LATENCY.labels(
+                method=request.method,
+                route=route.path if route is not None else "unmatched",
+                status=status_code,
+            ).observe(time.perf_counter() - start)
+
     # Include routers
     app.include_router(users.router, prefix="/api", tags=["users"])
     app.include_router(song.router, prefix="/api", tags=["song"])
-
-    # Create database tables
-    if not database_exists(engine.url):
-        create_database(engine.url)
-
-    Base.metadata.create_all(bind=engine)
+    app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
+    app.include_router(metrics.router, tags=["metrics"])
+    instrument_pool(async_engine.sync_engine)
     return app
 
 app = create_app()
\ No newline at end of file
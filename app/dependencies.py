@@ -1,48 +1,41 @@
-from typing import Generator
-from sqlalchemy.orm import Session
+from typing import AsyncGenerator, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
-from cachetools import TTLCache
 
+from app.lib.token_cache import token_cache
 from app.services.user_service import get_user
 from app.schemas.user import UserResponse
 from app.utils.auth import check_login_base
-from app.utils.database import SessionLocal
+from app.utils.database import AsyncSessionLocal
+from config.settings import Setting
 
 reusable_oauth2 = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token")
 
-def get_db() -> Generator:
-    db = SessionLocal()
-    try:
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-# 创建一个缓存，设置最大缓存数量和过期时间（单位：秒）
-token_cache = TTLCache(maxsize=1000, ttl=3600)
+async def validate_token(token: str) -> Optional[UserResponse]:
+    # 向 OA 服务器发送请求验证 token
+    user_info = await run_in_threadpool(check_login_base, token)
+    if user_info is None:
+        return None
+    # 验证可能被多个请求共享，不能使用某个请求的 db 会话
+    async with AsyncSessionLocal() as db:
+        return await get_user(db, user_info)
 
-def get_current_user(
-    db: Session = Depends(get_db), token: str = Depends(reusable_oauth2)
-) -> UserResponse:
+async def get_current_user(token: str = Depends(reusable_oauth2)) -> UserResponse:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
-    # 检查 token 是否在缓存中
-    if token in token_cache:
-        user = token_cache[token]
-    else:
-        # 向 OA 服务器发送请求验证 token
-        user_info = check_login_base(token)
-        
-        if user_info is None:
-            raise credentials_exception
-        user = get_user(db, user_info)
-        # 将验证后的用户信息存入缓存
-        token_cache[token] = user
-    
+
+    user = await token_cache.get_user(token, lambda: validate_token(token))
+    if user is None:
+        raise credentials_exception
     return user
 
 def get_current_active_user(current_user: UserResponse = Depends(get_current_user)) -> UserResponse:
@@ -53,4 +46,9 @@ def get_current_active_user(current_user: UserResponse = Depends(get_current_use
 def get_current_active_permission(current_user: UserResponse = Depends(get_current_user)) -> bool:
     if current_user is None or not current_user.is_active:
         return False
-    return True
\ No newline at end of file
+    return True
+
+def get_current_admin_user(current_user: UserResponse = Depends(get_current_active_user)) -> UserResponse:
+    if current_user.power < Setting.ADMIN_POWER:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin permission required")
+    return current_user
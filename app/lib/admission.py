@@ -0,0 +1,148 @@
+# lib/admission.py
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+
+from app.lib.utils import logger
+from app.schemas.user import UserResponse
+from app.utils.database import async_database_url, async_engine
+from config.settings import Setting
+
+class AdmissionController:
+    """
+    Process-wide gate in front of upstream generations.
+
+    At most `limit` generations run at once in this process. Waiters are
+    queued per team (falling back to the user) and admitted round-robin
+    across teams, so one team cannot starve the others. Once `max_queue`
+    requests are waiting, new ones are shed with 503 and `Retry-After`.
+
+    When `global_limit` is set and the database is Postgres, each admitted
+    generation also holds one of `global_limit` advisory-lock slots, which
+    caps concurrency across all uvicorn workers. An advisory lock lives as
+    long as its connection, so the slots are held on a dedicated pool of
+    `limit` connections (one per admitted generation, no overflow) rather
+    than the request pool; each worker process opens at most
+    GENERATION_CONCURRENCY extra database connections for them.
+    """
+    ADVISORY_NAMESPACE = 0x5A0C
+
+    def __init__(self, limit: int = Setting.GENERATION_CONCURRENCY, max_queue: int = Setting.GENERATION_QUEUE_LIMIT,
+                 retry_after: int = Setting.GENERATION_RETRY_AFTER, global_limit: int = Setting.GENERATION_GLOBAL_CONCURRENCY):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.global_limit = global_limit
+        self.active = 0
+        self.depth = 0
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._lock_engine: Optional[AsyncEngine] = None
+
+    @staticmethod
+    def fair_key(user: UserResponse) -> str:
+        return f"team:{user.team.id}" if user.team else f"user:{user.id}"
+
+    def ensure_capacity(self) -> None:
+        if self.active >= self.limit and self.depth >= self.max_queue:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Generation queue is full, please retry later",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+
+    @asynccontextmanager
+    async def slot(self, user: UserResponse) -> AsyncIterator[None]:
+        await self._acquire(self.fair_key(user))
+        try:
+            async with self._global_slot():
+                yield
+        finally:
+            self._release()
+
+    async def _acquire(self, key: str) -> None:
+        if self.active < self.limit and self.depth == 0:
+            self.active += 1
+            return
+        self.ensure_capacity()
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, deque()).append(future)
+        self.depth += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已被放行但调用方取消，归还名额
+                self._release()
+            else:
+                queue = self._queues.get(key)
+                if queue is not None and future in queue:
+                    queue.remove(future)
+                    self.depth -= 1
+                    if not queue:
+                        del self._queues[key]
+            raise
+
+    def _release(self) -> None:
+        self.active -= 1
+        while self.active < self.limit and self._queues:
+            key, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            self.depth -= 1
+            # 轮转到队尾，实现按团队轮询
+            del self._queues[key]
+            if queue:
+                self._queues[key] = queue
+            if future.done():
+                continue
+            self.active += 1
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def _global_slot(self) -> AsyncIterator[None]:
+        if not self.global_limit or async_engine.dialect.name != "postgresql":
+            yield
+            return
+
+        if self._lock_engine is None:
+            self._lock_engine = create_async_engine(
+                async_database_url(Setting.SQLALCHEMY_DATABASE_URL), pool_size=self.limit, max_overflow=0, pool_pre_ping=True,
+            )
+        slot: Optional[int] = None
+        async with self._lock_engine.connect() as conn:
+            try:
+                while slot is None:
+                    for candidate in range(self.global_limit):
+                        if await self._try_lock(conn, candidate):
+                            slot = candidate
+                            break
+                    else:
+                        await asyncio.sleep(Setting.GENERATION_GLOBAL_POLL)
+                yield
+            finally:
+                if slot is not None:
+                    await self._unlock(conn, slot)
+
+    async def _try_lock(self, conn: AsyncConnection, slot: int) -> bool:
+        locked = (await conn.execute(text("SELECT pg_try_advisory_lock(:ns, :slot)"), {"ns": self.ADVISORY_NAMESPACE, "slot": slot})).scalar()
+        await conn.commit()
+        return bool(locked)
+
+    async def _unlock(self, conn: AsyncConnection, slot: int) -> None:
+        try:
+            await conn.execute(text("SELECT pg_advisory_unlock(:ns, :slot)"), {"ns": self.ADVISORY_NAMESPACE, "slot": slot})
+            await conn.commit()
+        except Exception as e:
+            logger.warning(f"Failed to release generation slot {slot}: {e!r}")
+
+    async def close(self) -> None:
+        if self._lock_engine is not None:
+            await self._lock_engine.dispose()
+            self._lock_engine = None
+
+admission = AdmissionController()
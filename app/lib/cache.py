@@ -0,0 +1,144 @@
+# lib/cache.py
+import time
+from typing import Dict, Optional
+from cachetools import LRUCache
+
+from app.lib.utils import logger
+from config.settings import Setting
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # 仅 redis 后端需要
+    aioredis = None
+
+# 比较并删除须原子执行，避免删掉锁过期后他人重新持有的值
+DELETE_IF_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+class CacheBackend:
+    """
+    Minimal async key/value store for the shared caches. Values are strings
+    stored with a TTL; counters never expire.
+    """
+
+    async def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def add(self, key: str, value: str, ttl: float) -> bool:
+        """
+        Set `key` only if it is absent; True when this call stored it.
+        """
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def delete_if(self, key: str, value: str) -> bool:
+        """
+        Delete `key` only if it still holds `value`; True when it was deleted.
+        """
+        raise NotImplementedError
+
+    async def get_counter(self, key: str) -> int:
+        raise NotImplementedError
+
+    async def incr(self, key: str) -> int:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+class MemoryCache(CacheBackend):
+    """
+    Per-process LRU with per-entry expiry. Counters live outside the LRU so
+    an eviction can never roll a version back.
+    """
+
+    def __init__(self, maxsize: int):
+        self._values = LRUCache(maxsize=maxsize)
+        self._counters: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._values.pop(key, None)
+            return None
+        return value
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        self._values[key] = (time.monotonic() + ttl, value)
+
+    async def add(self, key: str, value: str, ttl: float) -> bool:
+        if await self.get(key) is not None:
+            return False
+        await self.set(key, value, ttl)
+        return True
+
+    async def delete(self, key: str) -> None:
+        self._values.pop(key, None)
+
+    async def delete_if(self, key: str, value: str) -> bool:
+        if await self.get(key) != value:
+            return False
+        self._values.pop(key, None)
+        return True
+
+    async def get_counter(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+    async def incr(self, key: str) -> int:
+        self._counters[key] = self._counters.get(key, 0) + 1
+        return self._counters[key]
+
+class RedisCache(CacheBackend):
+    """
+    Redis (or any Redis-compatible server) shared by all workers.
+    """
+
+    def __init__(self, url: str = Setting.REDIS_URL, prefix: str = ""):
+        if aioredis is None:
+            raise RuntimeError("The redis cache backend requires the redis package")
+        self.client = aioredis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self._delete_if = self.client.register_script(DELETE_IF_SCRIPT)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        await self.client.set(self.prefix + key, value, px=int(ttl * 1000))
+
+    async def add(self, key: str, value: str, ttl: float) -> bool:
+        return bool(await self.client.set(self.prefix + key, value, px=int(ttl * 1000), nx=True))
+
+    async def delete(self, key: str) -> None:
+        await self.client.delete(self.prefix + key)
+
+    async def delete_if(self, key: str, value: str) -> bool:
+        return bool(await self._delete_if(keys=[self.prefix + key], args=[value]))
+
+    async def get_counter(self, key: str) -> int:
+        value = await self.client.get(self.prefix + key)
+        return int(value) if value is not None else 0
+
+    async def incr(self, key: str) -> int:
+        return await self.client.incr(self.prefix + key)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+def create_cache(backend: str, maxsize: int, prefix: str = "") -> CacheBackend:
+    if backend == "redis":
+        logger.info(f"Using Redis cache for {prefix or 'default'} entries")
+        return RedisCache(Setting.REDIS_URL, prefix)
+    return MemoryCache(maxsize)
@@ -0,0 +1,60 @@
+# lib/clerk.py
+import asyncio, time
+from typing import Awaitable, Callable, Optional
+
+from app.lib.utils import logger, decode_jwt_exp
+from config.settings import Setting
+
+class ClerkTokenManager:
+    """
+    Keeps a Clerk session JWT valid for the lifetime of a SunoApi instance.
+
+    The token is reused until `CLERK_REFRESH_MARGIN` seconds before its `exp`,
+    a background task renews it ahead of expiry, and concurrent callers that
+    do need a refresh all await the same in-flight request.
+    """
+
+    def __init__(self, fetch: Callable[[], Awaitable[str]], margin: float = Setting.CLERK_REFRESH_MARGIN):
+        self._fetch = fetch
+        self.margin = margin
+        self.token: Optional[str] = None
+        self.expires_at: float = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+        self._refresher: Optional[asyncio.Task] = None
+
+    def is_fresh(self) -> bool:
+        return self.token is not None and time.time() < self.expires_at - self.margin
+
+    async def get_token(self) -> str:
+        if self.is_fresh():
+            return self.token
+        return await self.refresh()
+
+    async def refresh(self) -> str:
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._do_refresh())
+        # shield: 单个调用方被取消时不影响其他等待者
+        return await asyncio.shield(self._inflight)
+
+    async def _do_refresh(self) -> str:
+        token = await self._fetch()
+        self.token = token
+        self.expires_at = decode_jwt_exp(token) or time.time() + Setting.CLERK_DEFAULT_TTL
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.create_task(self._refresh_loop())
+        return token
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            delay = self.expires_at - self.margin - time.time()
+            await asyncio.sleep(max(delay, 1))
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Background token refresh failed: {e!r}")
+                await asyncio.sleep(5)
+
+    async def close(self) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
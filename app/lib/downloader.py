@@ -0,0 +1,83 @@
+# lib/downloader.py
+import hashlib, time
+import httpx
+from dataclasses import dataclass
+
+from app.lib.metrics import DOWNLOAD_BYTES, DOWNLOAD_LATENCY
+from app.lib.storage import Upload
+from app.lib.utils import logger, sleep
+from config.settings import Setting
+
+@dataclass
+class DownloadResult:
+    staged: str
+    size: int
+    sha256: str
+
+class MediaDownloader:
+    """
+    Async streaming downloader for generated media.
+
+    All downloads share one keep-alive connection pool. Bodies are streamed in
+    `DOWNLOAD_CHUNK_SIZE` blocks into a storage `Upload` (a staging file or
+    an S3 multipart upload) while being hashed; the caller then commits the
+    staged object under its content key, so readers never see a partial
+    file. Interrupted transfers are resumed with a `Range` request when the
+    server supports it.
+    """
+
+    def __init__(self, chunk_size: int = Setting.DOWNLOAD_CHUNK_SIZE, retries: int = Setting.DOWNLOAD_RETRIES):
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=Setting.DOWNLOAD_MAX_CONNECTIONS,
+                max_keepalive_connections=Setting.DOWNLOAD_MAX_CONNECTIONS,
+            ),
+            timeout=Setting.DOWNLOAD_TIMEOUT,
+            follow_redirects=True,
+        )
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+    async def download(self, url: str, upload: Upload, kind: str) -> DownloadResult:
+        logger.info(f"Downloading file from {url} to {upload.name}")
+        start = time.perf_counter()
+
+        hasher = hashlib.sha256()
+        written = 0
+        attempt = 0
+        while True:
+            try:
+                headers = {"Range": f"bytes={written}-"} if written else {}
+                async with self.client.stream("GET", url, headers=headers) as response:
+                    response.raise_for_status()
+                    if written and response.status_code != 206:
+                        # 服务端不支持断点续传，从头开始
+                        await upload.reset()
+                        hasher = hashlib.sha256()
+                        written = 0
+                    expected = response.headers.get("Content-Length")
+                    expected = written + int(expected) if expected is not None else None
+                    async for chunk in response.aiter_bytes(self.chunk_size):
+                        await upload.write(chunk)
+                        hasher.update(chunk)
+                        written += len(chunk)
+                    if expected is not None and written != expected:
+                        raise httpx.ReadError(f"Incomplete body: {written}/{expected} bytes")
+                await upload.complete()
+                break
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                if attempt >= self.retries:
+                    await upload.abort()
+                    raise
+                attempt += 1
+                logger.warning(f"Download of {url} failed at {written} bytes: {e!r}, retrying")
+                await sleep(min(2 ** attempt, 8))
+
+        DOWNLOAD_BYTES.labels(kind=kind).inc(written)
+        DOWNLOAD_LATENCY.labels(kind=kind).observe(time.perf_counter() - start)
+        return DownloadResult(staged=upload.name, size=written, sha256=hasher.hexdigest())
+
+media_downloader = MediaDownloader()
@@ -0,0 +1,44 @@
+# lib/lease.py
+import asyncio, os, socket, uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator
+
+from sqlalchemy import update
+from sqlalchemy.orm import InstrumentedAttribute
+
+from app.lib.utils import logger
+from app.utils.database import AsyncSessionLocal
+
+# 当前进程的身份，写入被认领行的 owner 列
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+def lease_expiry(ttl: float) -> datetime:
+    return datetime.now() + timedelta(seconds=ttl)
+
+@asynccontextmanager
+async def hold_lease(key: InstrumentedAttribute, value, owner: InstrumentedAttribute,
+                     until: InstrumentedAttribute, ttl: float) -> AsyncIterator[None]:
+    """
+    Keep this worker's lease on the row `key == value` alive while the block
+    runs, pushing `until` forward every `ttl / 3` seconds in its own session.
+    Renewal only touches the row while `owner` is still this worker.
+    """
+    model = key.class_
+
+    async def renew() -> None:
+        while True:
+            await asyncio.sleep(ttl / 3)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(update(model).where(key == value, owner == WORKER_ID).values({until.key: lease_expiry(ttl)}))
+                    await db.commit()
+            except Exception as e:
+                logger.warning(f"Failed to renew lease on {model.__tablename__} {value}: {e!r}")
+
+    task = asyncio.create_task(renew())
+    try:
+        yield
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,97 @@
+# lib/media_response.py
+import asyncio, mimetypes, os
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+from cachetools import TTLCache
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+from config.settings import Setting
+
+@dataclass
+class FileMeta:
+    stat: os.stat_result
+    etag: str
+    last_modified: str
+    content_type: str
+
+class StatCache:
+    """
+    In-memory cache of file metadata for media serving, so repeated hits
+    (players re-fetching and seeking) skip the `os.stat` syscall. Only
+    existing files are cached; entries expire after `MEDIA_STAT_CACHE_TTL`
+    and are dropped explicitly when a path is rewritten.
+    """
+
+    def __init__(self, maxsize: int = Setting.MEDIA_STAT_CACHE_SIZE, ttl: float = Setting.MEDIA_STAT_CACHE_TTL):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, path: str, content_key: Optional[str] = None) -> Optional[FileMeta]:
+        meta = self._cache.get(path)
+        if meta is not None:
+            return meta
+        try:
+            stat = await asyncio.to_thread(os.stat, path)
+        except FileNotFoundError:
+            return None
+        # 内容寻址文件用内容哈希作强 ETag，其余用 mtime+size
+        etag = f'"{content_key}"' if content_key else f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        meta = FileMeta(
+            stat=stat,
+            etag=etag,
+            last_modified=formatdate(stat.st_mtime, usegmt=True),
+            content_type=mimetypes.guess_type(path)[0] or "application/octet-stream",
+        )
+        self._cache[path] = meta
+        return meta
+
+    def invalidate(self, path: str) -> None:
+        self._cache.pop(path, None)
+
+stat_cache = StatCache()
+
+def _not_modified(request: Request, meta: FileMeta) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or meta.etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(meta.stat.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+async def media_response(request: Request, path: str, content_key: Optional[str] = None) -> Optional[Response]:
+    """
+    Serve a media file with validators, cache headers, conditional requests
+    (304) and byte ranges (206, handled by `FileResponse`). Content-addressed
+    files are marked immutable. With `MEDIA_ACCEL` set, the body is handed
+    off to the front proxy through `X-Accel-Redirect` (nginx) or
+    `X-Sendfile`. Returns None if the file does not exist.
+    """
+    meta = await stat_cache.get(path, content_key)
+    if meta is None:
+        return None
+
+    headers = {
+        "ETag": meta.etag,
+        "Last-Modified": meta.last_modified,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "public, max-age=31536000, immutable" if content_key else f"public, max-age={Setting.MEDIA_MAX_AGE}",
+    }
+    if _not_modified(request, meta):
+        return Response(status_code=304, headers=headers)
+
+    if Setting.MEDIA_ACCEL == "nginx":
+        relative = os.path.relpath(path, Setting.MEDIA_ROOT).replace(os.sep, "/")
+        headers["X-Accel-Redirect"] = f"{Setting.MEDIA_ACCEL_PREFIX.rstrip('/')}/{relative}"
+        return Response(headers=headers, media_type=meta.content_type)
+    if Setting.MEDIA_ACCEL == "sendfile":
+        headers["X-Sendfile"] = os.path.abspath(path)
+        return Response(headers=headers, media_type=meta.content_type)
+
+    # Range / If-Range 与 206、416 由 FileResponse 处理，文件在线程中读取
+    return FileResponse(path, headers=headers, media_type=meta.content_type, stat_result=meta.stat)
@@ -0,0 +1,98 @@
+# lib/media_store.py
+import re
+from typing import Optional, Tuple
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.lib.downloader import DownloadResult
+from app.lib.storage import Storage, storage
+from app.lib.utils import logger
+from app.models.table import MediaObject
+from app.utils.database import AsyncSessionLocal, upsert
+from config.settings import Setting
+
+class MediaStore:
+    """
+    Content-addressed media store on top of the configured `Storage` backend.
+
+    Objects are keyed by `<sha256><ext>` and sharded two levels deep
+    (`<kind>/ab/cd/<key>`), so directories stay small and identical content
+    is stored once. `media_objects` keeps a reference count per key: songs
+    take a reference when their media is ingested and drop it when they are
+    deleted, and `collect` removes objects nobody references any more.
+
+    Taking a reference locks the key's row until the caller commits, and
+    `collect` only deletes rows still at zero, so an object is never
+    removed while a new reference to it is being taken.
+    """
+    KEY_PATTERN = re.compile(r"^[0-9a-f]{64}\.[0-9a-z]+$")
+
+    def __init__(self, backend: Storage = storage):
+        self.storage = backend
+
+    @classmethod
+    def is_key(cls, name: str) -> bool:
+        return bool(cls.KEY_PATTERN.match(name))
+
+    async def put(self, db: AsyncSession, kind: str, result: DownloadResult, ext: str) -> str:
+        """
+        Commit a finished download under its content key, or drop it if the
+        content is already stored, and take a reference on the key in the
+        caller's transaction. If the caller rolls back, a new key's row goes
+        with it; the stored object is picked up again when the ingest lease
+        expires and the song is retried with the same content.
+        """
+        key = f"{result.sha256}{ext}"
+        await self._add_ref(db, kind, key, result.size)
+        await self.storage.commit(result.staged, kind, key)
+        return key
+
+    @staticmethod
+    async def _add_ref(db: AsyncSession, kind: str, key: str, size: int) -> None:
+        # 与调用方同一事务：先以 0 引用插入（已存在则不动），再加一，不另开连接
+        await db.execute(upsert(MediaObject, {"key": key, "kind": kind, "size": size, "refcount": 0}, ["key"]))
+        await db.execute(update(MediaObject).where(MediaObject.key == key).values(refcount=MediaObject.refcount + 1))
+
+    async def release(self, db: AsyncSession, key: Optional[str]) -> None:
+        """
+        Drop one reference on `key` in the caller's transaction.
+        """
+        if key:
+            await db.execute(
+                update(MediaObject).where(MediaObject.key == key, MediaObject.refcount > 0)
+                .values(refcount=MediaObject.refcount - 1)
+            )
+
+    async def collect(self, limit: int = Setting.MEDIA_GC_BATCH) -> int:
+        """
+        Delete up to `limit` objects with no references; returns how many.
+        """
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(MediaObject.key, MediaObject.kind).where(MediaObject.refcount == 0).limit(limit))
+            candidates = result.all()
+        removed = 0
+        for key, kind in candidates:
+            async with AsyncSessionLocal() as db:
+                try:
+                    # 行在提交前保持锁定，期间其他请求无法对该 key 新增引用
+                    deleted = await db.execute(delete(MediaObject).where(MediaObject.key == key, MediaObject.refcount == 0))
+                    if deleted.rowcount:
+                        await self.storage.delete(kind, key)
+                        removed += 1
+                    await db.commit()
+                except Exception as e:
+                    await db.rollback()
+                    logger.warning(f"Failed to remove unreferenced media {key}: {e!r}")
+        if removed:
+            logger.info(f"Removed {removed} unreferenced media objects")
+        return removed
+
+    async def locate(self, kind: str, key: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+        """
+        (local path, redirect URL) for a stored key; (None, None) if unknown.
+        """
+        if not key:
+            return None, None
+        return await self.storage.locate(kind, key)
+
+media_store = MediaStore()
@@ -0,0 +1,76 @@
+# lib/metrics.py
+import time
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+HTTP_REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route",
+    ["method", "route", "status"],
+)
+SUNO_REQUEST_LATENCY = Histogram(
+    "suno_request_duration_seconds", "Upstream Suno/Clerk request latency by endpoint",
+    ["endpoint", "status"],
+)
+SUNO_POLL_ITERATIONS = Histogram(
+    "suno_poll_iterations", "Feed polls per generation",
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55),
+)
+GENERATION_STAGE_LATENCY = Histogram(
+    "generation_stage_duration_seconds", "Time spent per generation stage",
+    ["stage"], buckets=(0.1, 0.5, 1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120, 180, 300),
+)
+DOWNLOAD_BYTES = Counter(
+    "media_download_bytes_total", "Bytes downloaded from upstream media URLs",
+    ["kind"],
+)
+DOWNLOAD_LATENCY = Histogram(
+    "media_download_duration_seconds", "Wall time per media download",
+    ["kind"],
+)
+DB_POOL_CHECKOUTS = Counter("db_pool_checkouts_total", "Connections checked out of the pool")
+DB_POOL_CONNECTS = Counter("db_pool_connects_total", "New DBAPI connections opened by the pool")
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out")
+DB_POOL_HOLD_TIME = Histogram(
+    "db_pool_connection_hold_seconds", "Time a connection stays checked out",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+TOKEN_CACHE_REQUESTS = Counter("token_cache_requests_total", "Bearer token cache lookups", ["result"])
+
+def suno_endpoint(url: str) -> str:
+    """
+    Collapse an upstream URL into a low-cardinality endpoint label.
+    """
+    path = url.split("://", 1)[-1].split("?", 1)[0]
+    if "/tokens" in path:
+        return "clerk_tokens"
+    if "/v1/client" in path:
+        return "clerk_client"
+    for endpoint in ("generate/v2", "generate/lyrics", "feed", "billing"):
+        if f"/api/{endpoint}" in path:
+            return endpoint
+    return "other"
+
+def instrument_pool(engine: Engine) -> None:
+    """
+    Count pool checkouts/connects and track how long connections are held.
+    SQLAlchemy has no hook before a checkout blocks, so pool saturation shows
+    up as `db_pool_checked_out` approaching pool size plus long hold times.
+    """
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        DB_POOL_CONNECTS.inc()
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKOUTS.inc()
+        DB_POOL_CHECKED_OUT.inc()
+        connection_record.info["checkout_at"] = time.perf_counter()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        checkout_at = connection_record.info.pop("checkout_at", None)
+        if checkout_at is not None:
+            DB_POOL_CHECKED_OUT.dec()
+            DB_POOL_HOLD_TIME.observe(time.perf_counter() - checkout_at)
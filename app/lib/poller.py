@@ -0,0 +1,69 @@
+# lib/poller.py
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.lib.utils import logger, AudioInfo
+from config.settings import Setting
+
+class FeedPoller:
+    """
+    Merges feed lookups from every in-flight generation into one batched
+    `/api/feed/?ids=` request per tick.
+
+    Callers `await fetch(ids)` as before; their ids are queued with a future
+    per clip, and a single background loop resolves all futures from the
+    batched response. Upstream request volume is bounded by the tick rate
+    rather than by the number of concurrent generations.
+    """
+
+    def __init__(self, fetch: Callable[[List[str]], Awaitable[List[AudioInfo]]],
+                 tick: float = Setting.FEED_POLL_TICK, batch_size: int = Setting.FEED_BATCH_SIZE):
+        self._fetch = fetch
+        self.tick = tick
+        self.batch_size = batch_size
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def fetch(self, song_ids: List[str]) -> List[AudioInfo]:
+        loop = asyncio.get_running_loop()
+        futures = []
+        for song_id in song_ids:
+            future = loop.create_future()
+            self._waiters.setdefault(song_id, []).append(future)
+            futures.append(future)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        # feed 未返回的 clip 不计入结果
+        return [result for result in results if result is not None]
+
+    async def _run(self) -> None:
+        while self._waiters:
+            await asyncio.sleep(self.tick)
+            waiters, self._waiters = self._waiters, {}
+            song_ids = list(waiters)
+            for i in range(0, len(song_ids), self.batch_size):
+                chunk = song_ids[i:i + self.batch_size]
+                try:
+                    audios = await self._fetch(chunk)
+                except Exception as e:
+                    logger.warning(f"Batched feed request for {len(chunk)} clips failed: {e!r}")
+                    for song_id in chunk:
+                        for future in waiters[song_id]:
+                            if not future.done():
+                                future.set_exception(e)
+                    continue
+                by_id = {audio.id: audio for audio in audios}
+                for song_id in chunk:
+                    for future in waiters[song_id]:
+                        if not future.done():
+                            future.set_result(by_id.get(song_id))
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,97 @@
+# lib/quota.py
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import AsyncIterator
+
+from fastapi import HTTPException, status
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.lib.utils import logger
+from app.models.table import DailyQuota
+from app.schemas.user import UserResponse
+from app.utils.database import AsyncSessionLocal, upsert
+from config.settings import Setting
+
+class Reservation:
+    """
+    One reserved unit. Call `spend` once Suno has accepted the generation;
+    from then on the unit is kept whatever happens to the request.
+    """
+
+    def __init__(self, user_id: int, day: date):
+        self.user_id = user_id
+        self.day = day
+        self.spent = False
+
+    def spend(self) -> None:
+        self.spent = True
+
+class QuotaLedger:
+    """
+    Per-user, per-day generation ledger in `daily_quotas`.
+
+    A generation reserves one unit before anything is sent upstream. The
+    reservation is a single conditional upsert, so concurrent requests can
+    never push `used` past `limit`. If the generation fails before Suno
+    accepts it, the unit is released; once clips exist upstream the credits
+    are gone, so the unit is kept even if polling, saving or the client
+    connection fails later. Reservations run in their own short transaction,
+    which makes them visible to other workers straight away.
+    """
+
+    def __init__(self, limit: int = Setting.DAILY_GENERATION_QUOTA):
+        self.limit = limit
+
+    def _exceeded(self) -> HTTPException:
+        return HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Daily generation quota exceeded")
+
+    async def remaining(self, db: AsyncSession, user_id: int) -> int:
+        used = await db.scalar(select(DailyQuota.used).where(DailyQuota.user_id == user_id, DailyQuota.day == date.today()))
+        return max(self.limit - (used or 0), 0)
+
+    async def ensure_available(self, user: UserResponse) -> None:
+        async with AsyncSessionLocal() as db:
+            if await self.remaining(db, user.id) <= 0:
+                raise self._exceeded()
+
+    async def _reserve(self, user_id: int, day: date) -> bool:
+        stmt = upsert(
+            DailyQuota, {"user_id": user_id, "day": day, "used": 1}, ["user_id", "day"],
+            {"used": DailyQuota.used + 1}, where=DailyQuota.used < self.limit,
+        ).returning(DailyQuota.used)
+        async with AsyncSessionLocal() as db:
+            used = (await db.execute(stmt)).scalar()
+            await db.commit()
+        return used is not None
+
+    async def release(self, user_id: int, day: date) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(DailyQuota)
+                    .where(DailyQuota.user_id == user_id, DailyQuota.day == day, DailyQuota.used > 0)
+                    .values(used=DailyQuota.used - 1)
+                )
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Failed to release quota for user {user_id} on {day}: {e!r}")
+
+    @asynccontextmanager
+    async def reserve(self, user: UserResponse) -> AsyncIterator[Reservation]:
+        """
+        Hold one generation for `user` today; raises 429 when none are left.
+        The unit is given back if the block raises before the reservation
+        was spent.
+        """
+        reservation = Reservation(user.id, date.today())
+        if not await self._reserve(reservation.user_id, reservation.day):
+            raise self._exceeded()
+        try:
+            yield reservation
+        except BaseException:
+            if not reservation.spent:
+                await self.release(reservation.user_id, reservation.day)
+            raise
+
+quota = QuotaLedger()
@@ -0,0 +1,63 @@
+# lib/response_cache.py
+from typing import Any, Awaitable, Callable, Optional
+from pydantic import BaseModel
+
+from app.lib.cache import CacheBackend, create_cache
+from app.lib.utils import json_dumps
+from config.settings import Setting
+
+class ResponseCache:
+    """
+    Per-user read-through cache of serialized read responses.
+
+    Entries are keyed by the user's current version, so `invalidate` only
+    has to bump that counter: every older entry becomes unreachable and
+    ages out by TTL. Invalidate after the write has committed; a reader
+    that raced the write stored its result under the old version. The
+    version must live in a store every worker shares, so the memory backend
+    is only accepted for a single worker.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float = Setting.RESPONSE_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+
+    @staticmethod
+    def _version_key(user_id: int) -> str:
+        return f"songs:version:{user_id}"
+
+    async def fetch(self, user_id: int, name: str, params: BaseModel,
+                    loader: Callable[[], Awaitable[Optional[Any]]]) -> Optional[str]:
+        """
+        JSON for `name(params)` as seen by `user_id`, loading and storing it
+        on a miss. The loader returns plain JSON-ready data, or None when it
+        finds nothing (which is not cached).
+        """
+        version = await self.backend.get_counter(self._version_key(user_id))
+        key = f"songs:{user_id}:{version}:{name}:{params.model_dump_json()}"
+        cached = await self.backend.get(key)
+        if cached is not None:
+            return cached
+        response = await loader()
+        if response is None:
+            return None
+        body = json_dumps(response)
+        await self.backend.set(key, body, self.ttl)
+        return body
+
+    async def invalidate(self, user_id: int) -> None:
+        await self.backend.incr(self._version_key(user_id))
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+def create_response_cache() -> ResponseCache:
+    # 进程内的版本号无法让其他 worker 的缓存失效
+    if Setting.RESPONSE_CACHE_BACKEND != "redis" and Setting.WORKERS > 1:
+        raise RuntimeError(
+            f"RESPONSE_CACHE_BACKEND={Setting.RESPONSE_CACHE_BACKEND} cannot invalidate across {Setting.WORKERS} workers; "
+            "set REDIS_URL or RESPONSE_CACHE_BACKEND=redis"
+        )
+    return ResponseCache(create_cache(Setting.RESPONSE_CACHE_BACKEND, Setting.RESPONSE_CACHE_SIZE, "response:"))
+
+response_cache = create_response_cache()
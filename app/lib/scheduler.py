@@ -0,0 +1,95 @@
+# lib/scheduler.py
+import math
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional
+
+from app.lib.utils import AudioInfo
+from config.settings import Setting
+
+class CompletionStats:
+    """
+    Rolling window of observed time-to-complete (seconds) per `model_name`.
+    """
+
+    def __init__(self, window: int = Setting.POLL_STATS_WINDOW):
+        self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, model_name: str, seconds: float) -> None:
+        self._samples[model_name].append(seconds)
+
+    def percentile(self, model_name: str, p: float) -> Optional[float]:
+        samples = self._samples.get(model_name)
+        if not samples or len(samples) < Setting.POLL_STATS_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+class PollSchedule:
+    """
+    Poll timing for a single generation.
+
+    The interval follows the least advanced clip: it backs off while clips sit
+    in `submitted`/`queued`, tightens once they are `streaming`, and shrinks
+    further as the elapsed time approaches the model's median completion time.
+    """
+    # 各状态的基础轮询间隔（秒）
+    STATUS_INTERVALS: Dict[str, float] = {
+        "submitted": 5.0,
+        "queued": 6.0,
+        "streaming": 2.0,
+    }
+    STATUS_ORDER: List[str] = ["submitted", "queued", "streaming", "complete"]
+    MIN_INTERVAL: float = 1.0
+    MAX_INTERVAL: float = 15.0
+    BACKOFF: float = 1.5
+
+    def __init__(self, first_wait: float, deadline: float, median: Optional[float]):
+        self.first_wait = first_wait
+        self.deadline = deadline
+        self.median = median
+        self._last_status: Optional[str] = None
+        self._repeats = 0
+
+    def _least_advanced(self, audios: List[AudioInfo]) -> str:
+        ranks = [self.STATUS_ORDER.index(audio.status) if audio.status in self.STATUS_ORDER else 0 for audio in audios]
+        return self.STATUS_ORDER[min(ranks)] if ranks else "submitted"
+
+    def next_interval(self, audios: List[AudioInfo], elapsed: float) -> float:
+        status = self._least_advanced(audios)
+        self._repeats = self._repeats + 1 if status == self._last_status else 0
+        self._last_status = status
+
+        interval = self.STATUS_INTERVALS.get(status, self.MIN_INTERVAL)
+        if status in ("submitted", "queued"):
+            interval *= self.BACKOFF ** self._repeats
+        if self.median is not None and elapsed < self.median:
+            interval = min(interval, max(self.median - elapsed, self.MIN_INTERVAL))
+        remaining = self.deadline - elapsed
+        return max(self.MIN_INTERVAL, min(interval, self.MAX_INTERVAL, remaining))
+
+class PollScheduler:
+    """
+    Builds per-generation `PollSchedule`s from historical completion times.
+
+    Until a model has enough samples, the fixed defaults are used; afterwards
+    the first wait comes from a low percentile and the deadline from a high
+    percentile of observed time-to-complete.
+    """
+
+    def __init__(self, stats: Optional[CompletionStats] = None):
+        self.stats = stats or CompletionStats()
+
+    def schedule(self, model_name: str) -> PollSchedule:
+        fast = self.stats.percentile(model_name, Setting.POLL_FIRST_WAIT_PERCENTILE)
+        slow = self.stats.percentile(model_name, Setting.POLL_DEADLINE_PERCENTILE)
+        median = self.stats.percentile(model_name, 50)
+
+        first_wait = Setting.POLL_FIRST_WAIT if fast is None else max(PollSchedule.MIN_INTERVAL, fast * 0.8)
+        deadline = Setting.POLL_DEADLINE if slow is None else min(max(slow * 1.5, Setting.POLL_DEADLINE_MIN), Setting.POLL_DEADLINE_MAX)
+        return PollSchedule(first_wait, deadline, median)
+
+    def record(self, model_name: str, seconds: float) -> None:
+        self.stats.record(model_name, seconds)
+
+poll_scheduler = PollScheduler()
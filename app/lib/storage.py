@@ -0,0 +1,265 @@
+# lib/storage.py
+import asyncio, os, uuid
+from typing import List, Optional, Tuple
+from cachetools import TTLCache
+
+from app.lib.media_response import stat_cache
+from app.lib.utils import logger
+from config.settings import Setting
+
+try:
+    import boto3
+    from botocore.client import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:  # 仅 s3 后端需要
+    boto3 = None
+
+def object_name(kind: str, key: str) -> str:
+    """
+    Sharded object name for a content key: `<kind>/ab/cd/<key>`.
+    """
+    return f"{kind}/{key[:2]}/{key[2:4]}/{key}"
+
+class Upload:
+    """
+    Sink for one streamed download. `name` identifies the staged object
+    until it is committed under its content key.
+    """
+    name: str
+
+    async def write(self, chunk: bytes) -> None:
+        raise NotImplementedError
+
+    async def reset(self) -> None:
+        raise NotImplementedError
+
+    async def complete(self) -> None:
+        raise NotImplementedError
+
+    async def abort(self) -> None:
+        raise NotImplementedError
+
+class Storage:
+    async def open_upload(self) -> Upload:
+        raise NotImplementedError
+
+    async def commit(self, staged: str, kind: str, key: str) -> None:
+        """
+        Move a completed upload to its content key, or discard it if that
+        key is already stored.
+        """
+        raise NotImplementedError
+
+    async def locate(self, kind: str, key: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Where to serve a stored key from: (local path, redirect URL).
+        """
+        raise NotImplementedError
+
+    async def delete(self, kind: str, key: str) -> None:
+        """
+        Remove a stored key; a key that is already gone is not an error.
+        """
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+class LocalUpload(Upload):
+    def __init__(self, path: str):
+        self.name = path
+        self._file = open(path, "wb")
+
+    async def write(self, chunk: bytes) -> None:
+        await asyncio.to_thread(self._file.write, chunk)
+
+    async def reset(self) -> None:
+        self._file.seek(0)
+        self._file.truncate()
+
+    async def complete(self) -> None:
+        await asyncio.to_thread(self._sync)
+        self._file.close()
+
+    async def abort(self) -> None:
+        self._file.close()
+        try:
+            await asyncio.to_thread(os.remove, self.name)
+        except FileNotFoundError:
+            pass
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+class LocalStorage(Storage):
+    """
+    Files under a local root, written to `tmp/` and atomically renamed into
+    the sharded layout.
+    """
+
+    def __init__(self, root: str = Setting.MEDIA_ROOT):
+        self.root = root
+
+    def path(self, kind: str, key: str) -> str:
+        return os.path.join(self.root, object_name(kind, key))
+
+    async def open_upload(self) -> Upload:
+        staging_dir = os.path.join(self.root, "tmp")
+        os.makedirs(staging_dir, exist_ok=True)
+        return LocalUpload(os.path.join(staging_dir, uuid.uuid4().hex))
+
+    @staticmethod
+    def _commit(staged: str, path: str) -> None:
+        if os.path.exists(path):
+            os.remove(staged)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(staged, path)
+
+    async def commit(self, staged: str, kind: str, key: str) -> None:
+        path = self.path(kind, key)
+        await asyncio.to_thread(self._commit, staged, path)
+        stat_cache.invalidate(path)
+
+    async def locate(self, kind: str, key: str) -> Tuple[Optional[str], Optional[str]]:
+        # 存在性由 stat 缓存回答，未命中时在线程中 stat，不阻塞事件循环
+        path = self.path(kind, key)
+        return (path, None) if await stat_cache.get(path, key) is not None else (None, None)
+
+    async def delete(self, kind: str, key: str) -> None:
+        path = self.path(kind, key)
+        try:
+            await asyncio.to_thread(os.remove, path)
+        except FileNotFoundError:
+            pass
+        stat_cache.invalidate(path)
+
+class S3Upload(Upload):
+    """
+    Multipart upload fed straight from the download stream; parts are sent
+    as soon as `S3_PART_SIZE` bytes are buffered.
+    """
+
+    def __init__(self, client, bucket: str, name: str, part_size: int):
+        self.client = client
+        self.bucket = bucket
+        self.name = name
+        self.part_size = part_size
+        self._buffer = bytearray()
+        self._parts: List[dict] = []
+        self._upload_id: Optional[str] = None
+
+    async def _ensure_started(self) -> None:
+        if self._upload_id is None:
+            response = await asyncio.to_thread(self.client.create_multipart_upload, Bucket=self.bucket, Key=self.name)
+            self._upload_id = response["UploadId"]
+
+    async def _flush_part(self) -> None:
+        await self._ensure_started()
+        body = bytes(self._buffer)
+        self._buffer.clear()
+        number = len(self._parts) + 1
+        response = await asyncio.to_thread(
+            self.client.upload_part, Bucket=self.bucket, Key=self.name,
+            UploadId=self._upload_id, PartNumber=number, Body=body,
+        )
+        self._parts.append({"ETag": response["ETag"], "PartNumber": number})
+
+    async def write(self, chunk: bytes) -> None:
+        self._buffer.extend(chunk)
+        if len(self._buffer) >= self.part_size:
+            await self._flush_part()
+
+    async def reset(self) -> None:
+        await self.abort()
+        self._buffer.clear()
+        self._parts = []
+
+    async def complete(self) -> None:
+        if self._upload_id is None:
+            # 小文件不走分片上传
+            await asyncio.to_thread(self.client.put_object, Bucket=self.bucket, Key=self.name, Body=bytes(self._buffer))
+            self._buffer.clear()
+            return
+        if self._buffer:
+            await self._flush_part()
+        await asyncio.to_thread(
+            self.client.complete_multipart_upload, Bucket=self.bucket, Key=self.name,
+            UploadId=self._upload_id, MultipartUpload={"Parts": self._parts},
+        )
+
+    async def abort(self) -> None:
+        if self._upload_id is not None:
+            await asyncio.to_thread(self.client.abort_multipart_upload, Bucket=self.bucket, Key=self.name, UploadId=self._upload_id)
+            self._upload_id = None
+
+class S3Storage(Storage):
+    """
+    S3-compatible object storage (MinIO, AWS S3). Media is served through
+    short-lived presigned URLs so the API never streams the bytes itself.
+    Like the local backend, `locate` only answers for objects that exist;
+    hits of the HEAD check are cached the same way as `stat_cache`.
+    """
+
+    def __init__(self):
+        if boto3 is None:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires boto3")
+        self.bucket = Setting.S3_BUCKET
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=Setting.S3_ENDPOINT_URL or None,
+            aws_access_key_id=Setting.S3_ACCESS_KEY,
+            aws_secret_access_key=Setting.S3_SECRET_KEY,
+            region_name=Setting.S3_REGION,
+            config=BotoConfig(signature_version="s3v4", max_pool_connections=Setting.DOWNLOAD_MAX_CONNECTIONS),
+        )
+        self._known = TTLCache(maxsize=Setting.MEDIA_STAT_CACHE_SIZE, ttl=Setting.MEDIA_STAT_CACHE_TTL)
+
+    async def open_upload(self) -> Upload:
+        return S3Upload(self.client, self.bucket, f"tmp/{uuid.uuid4().hex}", Setting.S3_PART_SIZE)
+
+    async def _exists(self, name: str) -> bool:
+        try:
+            await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=name)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    async def commit(self, staged: str, kind: str, key: str) -> None:
+        name = object_name(kind, key)
+        if not await self._exists(name):
+            await asyncio.to_thread(
+                self.client.copy_object, Bucket=self.bucket, Key=name,
+                CopySource={"Bucket": self.bucket, "Key": staged},
+            )
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=staged)
+
+    async def locate(self, kind: str, key: str) -> Tuple[Optional[str], Optional[str]]:
+        name = object_name(kind, key)
+        # 未知 key 不签名，交由调用方回退到上游地址
+        if name not in self._known:
+            if not await self._exists(name):
+                return None, None
+            self._known[name] = True
+        url = await asyncio.to_thread(
+            self.client.generate_presigned_url, "get_object",
+            Params={"Bucket": self.bucket, "Key": name},
+            ExpiresIn=Setting.S3_PRESIGN_TTL,
+        )
+        return None, url
+
+    async def delete(self, kind: str, key: str) -> None:
+        name = object_name(kind, key)
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=name)
+        self._known.pop(name, None)
+
+def create_storage() -> Storage:
+    if Setting.STORAGE_BACKEND == "s3":
+        logger.info(f"Using S3 media storage, bucket {Setting.S3_BUCKET}")
+        return S3Storage()
+    return LocalStorage()
+
+storage = create_storage()
@@ -1,39 +1,56 @@
 # lib/suno_api.py
-import os, time
-import requests
-from urllib3.util.retry import Retry
-from requests.adapters import HTTPAdapter
-from typing import Dict, Any, List, Optional
+import os, time, asyncio
+import httpx
+from typing import Dict, Any, AsyncIterator, List, Optional
 
+from app.lib.clerk import ClerkTokenManager
+from app.lib.metrics import GENERATION_STAGE_LATENCY, SUNO_POLL_ITERATIONS, SUNO_REQUEST_LATENCY, suno_endpoint
+from app.lib.poller import FeedPoller
+from app.lib.scheduler import poll_scheduler
 from app.lib.utils import logger, sleep, AudioInfo
+from config.settings import Setting
 
 class Singleton(type):
+    """
+    One instance per class and constructor arguments, so each Suno account
+    (cookie) keeps its own session, token and poller.
+    """
     _instances = {}
 
     def __call__(cls, *args, **kwargs):
-        if cls not in cls._instances:
-            cls._instances[cls] = super().__call__(*args, **kwargs)
-        return cls._instances[cls]
+        key = (cls, args, tuple(sorted(kwargs.items())))
+        if key not in cls._instances:
+            cls._instances[key] = super().__call__(*args, **kwargs)
+        return cls._instances[key]
+
+class SunoApiError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
 
 class SunoApi(metaclass=Singleton):
     BASE_URL: str = 'https://studio-api.suno.ai'
     CLERK_BASE_URL: str = 'https://clerk.suno.com'
+    RETRY_STATUS: tuple = (429, 500, 502, 503, 555)
+    # 非幂等请求（生成、续写）只在请求确定未被处理时重试
+    SAFE_RETRY_STATUS: tuple = (429,)
+    SAFE_RETRY_ERRORS: tuple = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+    MODEL: str = 'chirp-v3-0'
 
     def __init__(self, cookie: str):
         if not hasattr(self, 'session'):
-            self.session = requests.Session()
-            self.session.headers.update({
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36',
-                'Cookie': cookie
-            })
-            retry_strategy = Retry(
-                total=3,
-                status_forcelist=[429, 500, 502, 503, 555],
-                allowed_methods=["HEAD", "GET", "OPTIONS"]  # 使用 allowed_methods 参数
+            # 所有请求共用一个有上限的 keep-alive 连接池，不再阻塞事件循环
+            self.session = httpx.AsyncClient(
+                headers={
+                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36',
+                    'Cookie': cookie
+                },
+                limits=httpx.Limits(
+                    max_connections=Setting.SUNO_MAX_CONNECTIONS,
+                    max_keepalive_connections=Setting.SUNO_MAX_KEEPALIVE,
+                ),
+                timeout=Setting.SUNO_TIMEOUT,
             )
-            adapter = HTTPAdapter(max_retries=retry_strategy)
-            self.session.mount("https://", adapter)
-            self.session.mount("http://", adapter)
 
         if not hasattr(self, 'sid'):
             self.sid: Optional[str] = None
@@ -41,31 +58,91 @@ class SunoApi(metaclass=Singleton):
         if not hasattr(self, 'current_token'):
             self.current_token: Optional[str] = None
 
+        if not hasattr(self, 'tokens'):
+            self.tokens = ClerkTokenManager(self._renew_token)
+
+        if not hasattr(self, 'poller'):
+            self.poller = FeedPoller(self.get)
+
+        if not hasattr(self, 'scheduler'):
+            # 完成耗时按模型统计，所有账号共用
+            self.scheduler = poll_scheduler
+
+    async def close(self) -> None:
+        await self.poller.close()
+        await self.tokens.close()
+        await self.session.aclose()
+
+    async def _request(self, method: str, url: str, timeout: Optional[float] = None, idempotent: bool = True, **kwargs) -> httpx.Response:
+        """
+        Send a request through the shared pool, retrying transport errors and
+        retryable status codes with exponential backoff.
+
+        Requests that spend credits (`idempotent=False`) are only retried
+        when Suno cannot have acted on them: the connection was never made,
+        or the answer was 429. A timeout or 5xx after the body was sent may
+        still have started a paid generation, so it is returned or raised.
+        """
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        retry_status = self.RETRY_STATUS if idempotent else self.SAFE_RETRY_STATUS
+        retry_errors = httpx.TransportError if idempotent else self.SAFE_RETRY_ERRORS
+        endpoint = suno_endpoint(url)
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                response = await self.session.request(method, url, **kwargs)
+                SUNO_REQUEST_LATENCY.labels(endpoint=endpoint, status=response.status_code).observe(time.perf_counter() - start)
+                if response.status_code not in retry_status or attempt >= Setting.SUNO_RETRIES:
+                    return response
+                logger.warning(f"{method} {url} returned {response.status_code}, retrying")
+            except httpx.TransportError as e:
+                SUNO_REQUEST_LATENCY.labels(endpoint=endpoint, status="error").observe(time.perf_counter() - start)
+                if not isinstance(e, retry_errors) or attempt >= Setting.SUNO_RETRIES:
+                    raise
+                logger.warning(f"{method} {url} failed: {e!r}, retrying")
+            attempt += 1
+            await sleep(min(2 ** attempt, 8))
+
     async def init(self) -> 'SunoApi':
-        await self.get_auth_token()
-        await self.keep_alive()
+        if not self.sid:
+            await self.get_auth_token()
+        await self._ensure_token()
         return self
 
     async def get_auth_token(self) -> None:
         get_session_url = f"{self.CLERK_BASE_URL}/v1/client?_clerk_js_version=4.72.2"
-        session_response = self.session.get(get_session_url).json()
+        session_response = (await self._request("GET", get_session_url)).json()
         if not session_response.get('response', {}).get('last_active_session_id'):
             raise Exception("Failed to get session id, you may need to update the SUNO_COOKIE")
         self.sid = session_response['response']['last_active_session_id']
 
-    async def keep_alive(self, is_wait: bool = False) -> None:
+    async def _renew_token(self) -> str:
         if not self.sid:
-            raise Exception("Session ID is not set. Cannot renew token.")
+            await self.get_auth_token()
         renew_url = f"{SunoApi.CLERK_BASE_URL}/v1/client/sessions/{self.sid}/tokens?_clerk_js_version=4.72.2"
-        renew_response = self.session.post(renew_url).json()
+        renew_response = (await self._request("POST", renew_url)).json()
         logger.info("KeepAlive...\n")
+        return renew_response['jwt']
+
+    async def _ensure_token(self) -> None:
+        """
+        Attach a valid bearer token to the session, renewing it only when the
+        cached JWT is about to expire.
+        """
+        token = await self.tokens.get_token()
+        if token != self.current_token:
+            self.current_token = token
+            self.session.headers['Authorization'] = f'Bearer {token}'
+
+    async def keep_alive(self, is_wait: bool = False) -> None:
+        if not self.sid:
+            raise Exception("Session ID is not set. Cannot renew token.")
+        await self.tokens.refresh()
         if is_wait:
-            logger.info("Before sleep")
             await sleep(1, 2)
-            logger.info("After sleep")
-        new_token = renew_response['jwt']
-        self.current_token = new_token
-        self.session.headers.update({'Authorization': f'Bearer {new_token}'})
+        await self._ensure_token()
 
     async def generate(self, prompt: str, title: str, make_instrumental: bool = False, wait_audio: bool = True) -> List[AudioInfo]:
         if not hasattr(self, 'current_token'):
@@ -88,10 +165,10 @@ class SunoApi(metaclass=Singleton):
         return audios
 
     async def generate_songs(self, prompt: str, is_custom: bool, tags: Optional[str], title: Optional[str], make_instrumental: Optional[bool], wait_audio: bool = True) -> List[AudioInfo]:
-        await self.keep_alive(False)
+        await self._ensure_token()
         payload: Dict[str, Any] = {
             "make_instrumental": make_instrumental,
-            "mv": "chirp-v3-0",
+            "mv": self.MODEL,
             "title": title,
             "prompt": "",
         }
@@ -100,25 +177,15 @@ class SunoApi(metaclass=Singleton):
             payload["prompt"] = prompt
         else:
             payload["gpt_description_prompt"] = prompt
-        response = self.session.post(f"{SunoApi.BASE_URL}/api/generate/v2/", json=payload, timeout=10)
+        submit_start = time.perf_counter()
+        response = await self._request("POST", f"{SunoApi.BASE_URL}/api/generate/v2/", json=payload, timeout=10, idempotent=False)
+        GENERATION_STAGE_LATENCY.labels(stage="submit").observe(time.perf_counter() - submit_start)
         if response.status_code != 200:
-            raise Exception(f"Error response: {response.text}")
+            raise SunoApiError(f"Error response: {response.text}", response.status_code)
         song_ids = [audio["id"] for audio in response.json()["clips"]]
         if wait_audio:
-            start_time = time.time()
-            last_response: List[AudioInfo] = []
-            await sleep(5, 5)
-            while time.time() - start_time < 100:
-                response = await self.get(song_ids)
-                all_completed = all(audio.status in ['complete'] for audio in response)
-                if all_completed:
-                    return response
-                last_response = response
-                await sleep(3, 6)
-                await self.keep_alive(True)
-            return last_response
+            return await self.wait_songs(song_ids)
         else:
-            await self.keep_alive(True)
             return [AudioInfo(
                     id=audio["id"],
                     title=title,
@@ -136,14 +203,56 @@ class SunoApi(metaclass=Singleton):
                     duration=None  # Duration is not available in the clips data
                 ) for audio in response.json()["clips"]]
 
+    @staticmethod
+    def is_playable(audio: AudioInfo) -> bool:
+        return audio.status in ('streaming', 'complete') and bool(audio.audio_url)
+
+    async def wait_songs(self, song_ids: List[str], model_name: str = MODEL, playable: bool = False) -> List[AudioInfo]:
+        """
+        Poll the feed until every clip is complete (or, with `playable`, has
+        a streaming audio_url) or the deadline passes. Returns the last feed
+        response either way.
+        """
+        last_response: List[AudioInfo] = []
+        async for response in self.watch_songs(song_ids, model_name, playable):
+            last_response = response
+        return last_response
+
+    async def watch_songs(self, song_ids: List[str], model_name: str = MODEL, playable: bool = False) -> AsyncIterator[List[AudioInfo]]:
+        """
+        Yield every feed response for the clips until they are all complete
+        (or playable) or the deadline passes. Lookups go through the shared
+        poller, so concurrent generations share one feed request, and the wait
+        between polls follows the clips' status progression.
+        """
+        # 等到可播放与等到完成的耗时分开统计
+        stats_key = f"{model_name}:playable" if playable else model_name
+        done = self.is_playable if playable else (lambda audio: audio.status == 'complete')
+        schedule = self.scheduler.schedule(stats_key)
+        start_time = time.time()
+        polls = 0
+        try:
+            await asyncio.sleep(schedule.first_wait)
+            while time.time() - start_time < schedule.deadline:
+                response = await self.poller.fetch(song_ids)
+                polls += 1
+                yield response
+                if len(response) == len(song_ids) and all(done(audio) for audio in response):
+                    self.scheduler.record(stats_key, time.time() - start_time)
+                    return
+                await asyncio.sleep(schedule.next_interval(response, time.time() - start_time))
+        finally:
+            SUNO_POLL_ITERATIONS.observe(polls)
+            GENERATION_STAGE_LATENCY.labels(stage="poll").observe(time.time() - start_time)
+
     async def generate_lyrics(self, prompt: str) -> str:
-        await self.keep_alive(False)
-        generate_response = self.session.post(f"{SunoApi.BASE_URL}/api/generate/lyrics/", json={"prompt": prompt}).json()
+        await self._ensure_token()
+        generate_response = (await self._request("POST", f"{SunoApi.BASE_URL}/api/generate/lyrics/", json={"prompt": prompt})).json()
         generate_id = generate_response["id"]
-        lyrics_response = self.session.get(f"{SunoApi.BASE_URL}/api/generate/lyrics/{generate_id}").json()
+        lyrics_response = (await self._request("GET", f"{SunoApi.BASE_URL}/api/generate/lyrics/{generate_id}")).json()
         while lyrics_response.get("status") != "complete":
             await sleep(2)
-            lyrics_response = self.session.get(f"{SunoApi.BASE_URL}/api/generate/lyrics/{generate_id}").json()
+            lyrics_response = (await self._request("GET", f"{SunoApi.BASE_URL}/api/generate/lyrics/{generate_id}")).json()
         return lyrics_response
 
     def parse_lyrics(self, prompt: str) -> str:
@@ -151,12 +260,15 @@ class SunoApi(metaclass=Singleton):
         return "\n".join(lines)
 
     async def get(self, song_ids: Optional[List[str]] = None) -> List[AudioInfo]:
-        await self.keep_alive(False)
+        await self._ensure_token()
         url = f"{SunoApi.BASE_URL}/api/feed/"
         if song_ids:
             url = f"{url}?ids={','.join(song_ids)}"
         logger.info(f"Get audio status: {url}")
-        response = self.session.get(url, timeout=3).json()
+        response = await self._request("GET", url, timeout=3)
+        if response.status_code != 200:
+            raise SunoApiError(f"Feed error response: {response.text}", response.status_code)
+        response = response.json()
         return [AudioInfo(
             id=audio["id"],
             title=audio["title"],
@@ -175,20 +287,23 @@ class SunoApi(metaclass=Singleton):
         ) for audio in response]
 
     async def extendAudio(self, audio_id: str, prompt: str="", continueAt: str="0", tags: str="", title: str=""):
-        await self.keep_alive(False)
-        response = self.session.post(f"{SunoApi.BASE_URL}/api/generate/v2/", json={
+        await self._ensure_token()
+        response = await self._request("POST", f"{SunoApi.BASE_URL}/api/generate/v2/", json={
             "continue_clip_id": audio_id,
             "prompt": prompt,
             "continue_at": continueAt,
             "mv": "chirp-v3-0",
             "tags": tags,
             "title": title
-        })
+        }, idempotent=False)
         return response
 
     async def get_credits(self) -> Dict[str, Any]:
-        await self.keep_alive(False)
-        response = self.session.get(f"{SunoApi.BASE_URL}/api/billing/info/").json()
+        await self._ensure_token()
+        response = await self._request("GET", f"{SunoApi.BASE_URL}/api/billing/info/")
+        if response.status_code != 200:
+            raise SunoApiError(f"Billing error response: {response.text}", response.status_code)
+        response = response.json()
         return {
             "credits_left": response["total_credits_left"],
             "period": response["period"],
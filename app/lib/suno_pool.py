@@ -0,0 +1,119 @@
+# lib/suno_pool.py
+import asyncio, hashlib, time
+import httpx
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+from fastapi import HTTPException, status
+
+from app.lib.suno import SunoApi, SunoApiError
+from app.lib.utils import logger
+from config.settings import Setting
+
+class SunoAccount:
+    def __init__(self, cookie: str):
+        self.key = hashlib.sha1(cookie.encode()).hexdigest()[:12]
+        self.api = SunoApi(cookie=cookie)
+        self.in_flight = 0
+        self.credits_left: Optional[int] = None
+        self.failures = 0
+        self.disabled_until = 0.0
+
+    @property
+    def available(self) -> bool:
+        if time.time() < self.disabled_until:
+            return False
+        return self.credits_left is None or self.credits_left >= Setting.SUNO_CREDITS_PER_GENERATION
+
+    def __repr__(self):
+        return f"<SunoAccount(key={self.key}, in_flight={self.in_flight}, credits_left={self.credits_left})>"
+
+class SunoAccountPool:
+    """
+    Routes generations across several Suno accounts.
+
+    Each generation goes to the least-loaded account that still has credits.
+    Credits are refreshed in the background through `get_credits`. Accounts
+    that hit 429 or fail `SUNO_ACCOUNT_MAX_FAILURES` times in a row are taken
+    out of rotation for `SUNO_ACCOUNT_COOLDOWN` seconds.
+    """
+
+    def __init__(self, cookies: List[str]):
+        self.accounts: Dict[str, SunoAccount] = {}
+        for cookie in cookies:
+            account = SunoAccount(cookie)
+            self.accounts[account.key] = account
+        self._refresher: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+        for account in self.accounts.values():
+            await account.api.close()
+
+    def _pick(self) -> SunoAccount:
+        candidates = [account for account in self.accounts.values() if account.available]
+        if not candidates:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="No Suno account available, please retry later",
+                headers={"Retry-After": str(Setting.GENERATION_RETRY_AFTER)},
+            )
+        return min(candidates, key=lambda account: (account.in_flight, -(account.credits_left or 0)))
+
+    @asynccontextmanager
+    async def acquire(self, key: Optional[str] = None) -> AsyncIterator[SunoAccount]:
+        """
+        Borrow an account for one generation. Pass `key` to pin a generation
+        to the account that submitted its clips (e.g. when resuming a job).
+        """
+        account = self.accounts.get(key) if key else None
+        if account is None:
+            account = self._pick()
+        account.in_flight += 1
+        try:
+            await account.api.init()
+            yield account
+            account.failures = 0
+        except SunoApiError as e:
+            self.report_failure(account, e.status_code == 429)
+            raise
+        except httpx.HTTPError:
+            self.report_failure(account)
+            raise
+        finally:
+            account.in_flight -= 1
+
+    def charge(self, account: SunoAccount) -> None:
+        if account.credits_left is not None:
+            account.credits_left -= Setting.SUNO_CREDITS_PER_GENERATION
+
+    def report_failure(self, account: SunoAccount, rate_limited: bool = False) -> None:
+        account.failures += 1
+        if rate_limited or account.failures >= Setting.SUNO_ACCOUNT_MAX_FAILURES:
+            account.disabled_until = time.time() + Setting.SUNO_ACCOUNT_COOLDOWN
+            account.failures = 0
+            logger.warning(f"Suno account {account.key} removed from rotation for {Setting.SUNO_ACCOUNT_COOLDOWN}s")
+
+    async def refresh_credits(self, account: SunoAccount) -> None:
+        try:
+            await account.api.init()
+            credits = await account.api.get_credits()
+            account.credits_left = credits["credits_left"]
+        except SunoApiError as e:
+            logger.warning(f"Failed to refresh credits for Suno account {account.key}: {e}")
+            self.report_failure(account, e.status_code == 429)
+        except Exception as e:
+            logger.warning(f"Failed to refresh credits for Suno account {account.key}: {e!r}")
+            self.report_failure(account)
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.gather(*(self.refresh_credits(account) for account in self.accounts.values()))
+            await asyncio.sleep(Setting.SUNO_CREDITS_REFRESH)
+
+suno_pool = SunoAccountPool(Setting.COOKIES)
@@ -0,0 +1,125 @@
+# lib/token_cache.py
+import asyncio, hashlib, time, uuid
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from cachetools import LRUCache
+
+from app.lib.cache import CacheBackend, RedisCache
+from app.lib.metrics import TOKEN_CACHE_REQUESTS
+from app.lib.utils import decode_jwt_exp, logger
+from app.schemas.user import UserResponse
+from config.settings import Setting
+
+REJECTED = "-"
+
+class TokenCache:
+    """
+    Two-tier cache of validated OA bearer tokens.
+
+    Lookups hit a per-process LRU first, then the shared store (Redis) so a
+    token validated by one worker is reused by the others. Misses are
+    single-flight: concurrent requests for the same token in a process await
+    one validation task, and across workers a short-lived lock makes the
+    others wait for the first result instead of calling OA themselves.
+    Rejected tokens are cached for `TOKEN_NEGATIVE_TTL`; accepted ones until
+    the token's own `exp` (capped at `TOKEN_CACHE_MAX_TTL`). Tokens are only
+    stored as SHA-256 digests.
+    """
+
+    def __init__(self, shared: Optional[CacheBackend] = None, maxsize: int = Setting.TOKEN_CACHE_SIZE):
+        self.shared = shared
+        self._local: LRUCache = LRUCache(maxsize=maxsize)
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def ttl_for(token: str) -> float:
+        exp = decode_jwt_exp(token)
+        if exp is None:
+            return Setting.TOKEN_CACHE_DEFAULT_TTL
+        return min(exp - time.time(), Setting.TOKEN_CACHE_MAX_TTL)
+
+    async def get_user(self, token: str, validate: Callable[[], Awaitable[Optional[UserResponse]]]) -> Optional[UserResponse]:
+        """
+        The user for `token`, or None if it is rejected. `validate` runs at
+        most once per token per process at a time.
+        """
+        digest = hashlib.sha256(token.encode()).hexdigest()
+        found, user = self._get_local(digest)
+        if found:
+            TOKEN_CACHE_REQUESTS.labels(result="hit" if user is not None else "rejected_hit").inc()
+            return user
+        task = self._inflight.get(digest)
+        if task is None:
+            task = asyncio.create_task(self._resolve(digest, token, validate))
+            self._inflight[digest] = task
+            task.add_done_callback(lambda _: self._inflight.pop(digest, None))
+        # shield: 单个请求被取消时不影响其他等待同一 token 的请求
+        return await asyncio.shield(task)
+
+    def _get_local(self, digest: str) -> Tuple[bool, Optional[UserResponse]]:
+        entry = self._local.get(digest)
+        if entry is None:
+            return False, None
+        expires_at, user = entry
+        if expires_at <= time.monotonic():
+            self._local.pop(digest, None)
+            return False, None
+        return True, user
+
+    def _set_local(self, digest: str, user: Optional[UserResponse], ttl: float) -> None:
+        self._local[digest] = (time.monotonic() + ttl, user)
+
+    async def _get_shared(self, digest: str) -> Tuple[bool, Optional[UserResponse]]:
+        if self.shared is None:
+            return False, None
+        value = await self.shared.get(f"token:{digest}")
+        if value is None:
+            return False, None
+        return True, None if value == REJECTED else UserResponse.model_validate_json(value)
+
+    async def _resolve(self, digest: str, token: str, validate: Callable[[], Awaitable[Optional[UserResponse]]]) -> Optional[UserResponse]:
+        ttl = self.ttl_for(token)
+        if ttl <= 0:
+            # exp 已过，无需再问 OA
+            TOKEN_CACHE_REQUESTS.labels(result="expired").inc()
+            return None
+
+        found, user = await self._get_shared(digest)
+        if found:
+            TOKEN_CACHE_REQUESTS.labels(result="shared_hit").inc()
+            self._set_local(digest, user, ttl if user is not None else Setting.TOKEN_NEGATIVE_TTL)
+            return user
+
+        lock_key = f"token-lock:{digest}"
+        # 锁值唯一，只释放自己持有的锁
+        lock_owner = uuid.uuid4().hex if self.shared is not None else None
+        if lock_owner is not None and not await self.shared.add(lock_key, lock_owner, Setting.TOKEN_LOCK_TTL):
+            lock_owner = None
+            # 其他 worker 正在验证同一 token，等待其写入结果
+            deadline = time.monotonic() + Setting.TOKEN_LOCK_TTL
+            while time.monotonic() < deadline:
+                await asyncio.sleep(Setting.TOKEN_LOCK_POLL)
+                found, user = await self._get_shared(digest)
+                if found:
+                    TOKEN_CACHE_REQUESTS.labels(result="shared_hit").inc()
+                    self._set_local(digest, user, ttl if user is not None else Setting.TOKEN_NEGATIVE_TTL)
+                    return user
+            logger.warning("Timed out waiting for another worker to validate a token")
+
+        TOKEN_CACHE_REQUESTS.labels(result="miss").inc()
+        try:
+            user = await validate()
+            if user is None:
+                ttl = Setting.TOKEN_NEGATIVE_TTL
+            self._set_local(digest, user, ttl)
+            if self.shared is not None:
+                await self.shared.set(f"token:{digest}", user.model_dump_json() if user is not None else REJECTED, ttl)
+        finally:
+            if lock_owner is not None:
+                await self.shared.delete_if(lock_key, lock_owner)
+        return user
+
+    async def close(self) -> None:
+        if self.shared is not None:
+            await self.shared.close()
+
+token_cache = TokenCache(RedisCache(Setting.REDIS_URL, "auth:") if Setting.TOKEN_CACHE_BACKEND == "redis" else None)
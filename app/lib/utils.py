@@ -1,7 +1,12 @@
 import logging
 import colorlog
-import random, asyncio
-from typing import Optional
+import random, asyncio, base64, json
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:  # 未安装时回退到标准库 json
+    orjson = None
 
 
 logger = logging.getLogger()
@@ -90,3 +95,33 @@ async def sleep(x: int, y: int = None) -> None:
         timeout = random.randint(min_val, max_val)
     
     await asyncio.sleep(timeout)
+
+def decode_jwt_exp(token: str) -> Optional[float]:
+    """
+    Read the `exp` claim of a JWT without verifying it.
+
+    :param token: Encoded JWT.
+    :return: Expiry as a unix timestamp, or None if the token has no readable `exp`.
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+        return float(exp) if exp is not None else None
+    except (IndexError, ValueError, TypeError, AttributeError):
+        return None
+
+def sse_event(event: str, data) -> str:
+    """
+    Format one Server-Sent Events message with a JSON payload.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+def json_dumps(data: Any) -> str:
+    """
+    Serialize plain data (dicts, lists, scalars) to a compact JSON string,
+    using orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(data).decode()
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
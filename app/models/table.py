@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, UniqueConstraint
+from sqlalchemy import Boolean, Column, Date, ForeignKey, Index, Integer, String, Text, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -36,6 +36,9 @@ class Studio(Base):
 
     is_active = Column(Boolean, default=True)
 
+    # 登录时按名称 upsert
+    __table_args__ = (UniqueConstraint("name", name="uq_studios_name"),)
+
     def __repr__(self):
         return f"<Studio(id={self.id}, name='{self.name}')>"
 
@@ -51,6 +54,8 @@ class Team(Base):
 
     is_active = Column(Boolean, default=True)
 
+    __table_args__ = (UniqueConstraint("studio_id", "name", name="uq_teams_studio_name"),)
+
     def __repr__(self):
         return f"<Team(id={self.id}, name='{self.name}')>"
 
@@ -63,6 +68,9 @@ class TeamMember(Base):
     user = relationship("User", back_populates="teams")
     team = relationship("Team", back_populates="members")
 
+    # 主键 (user_id, team_id) 已覆盖按用户查询，补充按团队查成员的索引
+    __table_args__ = (Index("ix_team_members_team_id", team_id),)
+
 
 class Song(Base):
     __tablename__ = "songs"
@@ -73,10 +81,18 @@ class Song(Base):
     team_id = Column(Integer, ForeignKey("teams.id", ondelete="CASCADE"))
 
     title = Column(String)
+    clip_id = Column(String, index=True) # Suno clip id
 
     image_url = Column(String)
-    audio_url = Column(String)
+    audio_url = Column(String, index=True) # 旧版下载记录按文件名反查
     video_url = Column(String)
+    source_image_url = Column(String) # 上游封面地址
+    source_audio_url = Column(String) # 上游音频地址（可能是流式地址）
+    media_status = Column(String, default="pending") # pending / ingesting / ready / failed
+    media_owner = Column(String) # 正在入库该歌曲媒体的 worker
+    media_lease_until = Column(BeijingDateTime) # 入库租约到期时间
+    image_key = Column(String, index=True) # 内容寻址存储中的封面 key
+    audio_key = Column(String, index=True) # 内容寻址存储中的音频 key
     model_name = Column(String)  
     gpt_description_prompt = Column(Text) 
     type = Column(String)
@@ -94,9 +110,57 @@ class Song(Base):
     created_by = relationship("User", back_populates="songs")
     logs = relationship("Log", back_populates="song")
 
+    # 与 SongService 的查询形状对应；修改后需同步 migrations/versions
+    __table_args__ = (
+        Index("ix_songs_user_active_id", user_id, id.desc(), postgresql_where=is_active == True, sqlite_where=is_active == True),
+        Index("ix_songs_user_created", user_id, created_at),
+        Index("ix_songs_user_title_id", user_id, title, id),
+        Index("ix_songs_team_active", team_id, postgresql_where=is_active == True, sqlite_where=is_active == True),
+        Index("ix_songs_studio_active", studio_id, postgresql_where=is_active == True, sqlite_where=is_active == True),
+        Index(
+            "ix_songs_media_unfinished", media_status,
+            postgresql_where=media_status.in_(("pending", "ingesting")), sqlite_where=media_status.in_(("pending", "ingesting")),
+        ),
+    )
+
     def __repr__(self):
         return f"<Song(id={self.id}, title='{self.title}')>"
 
+class UserSongCount(Base):
+    __tablename__ = "user_song_counts"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    active_songs = Column(Integer, default=0, nullable=False) # 由 save_songs / delete_song 维护
+
+    def __repr__(self):
+        return f"<UserSongCount(user_id={self.user_id}, active_songs={self.active_songs})>"
+
+class DailyQuota(Base):
+    __tablename__ = "daily_quotas"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    used = Column(Integer, default=0, nullable=False) # 当日已预占的生成次数
+
+    def __repr__(self):
+        return f"<DailyQuota(user_id={self.user_id}, day={self.day}, used={self.used})>"
+
+class MediaObject(Base):
+    __tablename__ = "media_objects"
+
+    key = Column(String, primary_key=True) # sha256 + 扩展名
+    kind = Column(String) # images / audios
+    size = Column(Integer)
+    refcount = Column(Integer, default=0) # 引用该对象的歌曲数，为 0 时由 MediaStore.collect 回收
+    created_at = Column(BeijingDateTime, default=datetime.now)
+
+    __table_args__ = (
+        Index("ix_media_objects_unreferenced", key, postgresql_where=refcount == 0, sqlite_where=refcount == 0),
+    )
+
+    def __repr__(self):
+        return f"<MediaObject(key={self.key}, refcount={self.refcount})>"
+
 class Log(Base):
     __tablename__ = "logs"
 
@@ -111,6 +175,51 @@ class Log(Base):
     user = relationship("User", back_populates="logs")
     song = relationship("Song", back_populates="logs")
 
+    __table_args__ = (Index("ix_logs_song_created", song_id, created_at),)
+
     def __repr__(self):
         return f"<Log(id={self.id}, action='{self.action}')>"
-    
\ No newline at end of file
+
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+
+    id = Column(String(32), primary_key=True) # uuid hex
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    account = Column(String(12)) # 提交任务的 Suno 账号
+
+    kind = Column(String) # generate / custom
+    title = Column(String)
+    clip_ids = Column(String) # Suno clip id，逗号分隔
+    song_ids = Column(String) # 入库后的歌曲 id，逗号分隔
+    status = Column(String, default="pending", index=True) # pending / running / complete / failed
+    error = Column(String)
+    owner = Column(String) # 运行该任务的 worker
+    lease_until = Column(BeijingDateTime) # 租约到期时间，到期未续约视为 worker 失联
+
+    created_at = Column(BeijingDateTime, default=datetime.now)
+    updated_at = Column(BeijingDateTime, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self):
+        return f"<GenerationJob(id={self.id}, status='{self.status}')>"
+
+class UsageDaily(Base):
+    __tablename__ = "usage_daily"
+
+    day = Column(Date, primary_key=True)
+    studio_id = Column(Integer, primary_key=True) # 0 表示无工作室
+    team_id = Column(Integer, primary_key=True) # 0 表示无团队
+
+    songs = Column(Integer, default=0, nullable=False) # 当日生成的歌曲数
+    downloads = Column(Integer, default=0, nullable=False) # 当日下载次数
+
+    def __repr__(self):
+        return f"<UsageDaily(day={self.day}, studio_id={self.studio_id}, team_id={self.team_id})>"
+
+class RollupWatermark(Base):
+    __tablename__ = "rollup_watermarks"
+
+    name = Column(String, primary_key=True) # songs / logs
+    last_id = Column(Integer, default=0, nullable=False) # 已汇总的最大 id
+
+    def __repr__(self):
+        return f"<RollupWatermark(name={self.name}, last_id={self.last_id})>"
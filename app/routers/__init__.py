@@ -1,2 +1,4 @@
 from .song import *
-from .users import *
\ No newline at end of file
+from .users import *
+from .metrics import *
+from .admin import *
\ No newline at end of file
@@ -0,0 +1,109 @@
+# app/routers/admin.py
+from datetime import date, timedelta
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.dependencies import get_current_admin_user, get_db
+from app.schemas.stats import UsageDailyResponse, UsageTotalResponse
+from app.schemas.user import StudioDirectoryResponse, TeamDirectoryResponse, UserResponse
+from app.services.rollup_service import get_daily_usage, get_usage_totals
+from app.services.user_service import get_studios, get_teams, get_user_by_id, get_users
+
+router = APIRouter(dependencies=[Depends(get_current_admin_user)])
+
+# 用户目录
+@router.get("/users", response_model=List[UserResponse])
+async def list_users(
+    skip: int = 0,
+    limit: int = 100,
+    name: Optional[str] = None,
+    studio_id: Optional[int] = None,
+    team_id: Optional[int] = None,
+    is_active: Optional[bool] = True,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Lists users with their team and studio, filtered by name, studio, team or active state.
+    """
+    return await get_users(db, skip, limit, name, studio_id, team_id, is_active)
+
+@router.get("/users/{user_id}", response_model=UserResponse)
+async def user_detail(user_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    Retrieves one active user with their team and studio.
+    """
+    user = await get_user_by_id(db, user_id)
+    if user is None:
+        raise HTTPException(status_code=555, detail="User not found")
+    return user
+
+# 团队目录
+@router.get("/teams", response_model=List[TeamDirectoryResponse])
+async def list_teams(
+    skip: int = 0,
+    limit: int = 100,
+    name: Optional[str] = None,
+    studio_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Lists teams with their studio, member count and active song count.
+    """
+    return await get_teams(db, skip, limit, name, studio_id)
+
+# 工作室目录
+@router.get("/studios", response_model=List[StudioDirectoryResponse])
+async def list_studios(
+    skip: int = 0,
+    limit: int = 100,
+    name: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Lists studios with their team, member and active song counts.
+    """
+    return await get_studios(db, skip, limit, name)
+
+def _date_range(start: Optional[date], end: Optional[date]) -> tuple:
+    # 默认统计最近 30 天
+    end = end or date.today()
+    return start or end - timedelta(days=29), end
+
+# 按天的用量明细，只读汇总表
+@router.get("/stats/daily", response_model=List[UsageDailyResponse])
+async def daily_stats(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    studio_id: Optional[int] = None,
+    team_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Songs generated and downloads per day, studio and team.
+    """
+    start, end = _date_range(start, end)
+    return await get_daily_usage(db, start, end, studio_id, team_id)
+
+# 按工作室汇总
+@router.get("/stats/studios", response_model=List[UsageTotalResponse])
+async def studio_stats(start: Optional[date] = None, end: Optional[date] = None, db: AsyncSession = Depends(get_db)):
+    """
+    Songs generated and downloads per studio over a date range.
+    """
+    start, end = _date_range(start, end)
+    return await get_usage_totals(db, "studio", start, end)
+
+# 按团队汇总
+@router.get("/stats/teams", response_model=List[UsageTotalResponse])
+async def team_stats(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    studio_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Songs generated and downloads per team over a date range, optionally within one studio.
+    """
+    start, end = _date_range(start, end)
+    return await get_usage_totals(db, "team", start, end, studio_id)
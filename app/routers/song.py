@@ -1,43 +1,51 @@
 # app/routers/song.py
 import os
-from fastapi import APIRouter, Depends, HTTPException, Body
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Body, Request, Response
+from fastapi.responses import RedirectResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.schemas.song import *
 from app.schemas.user import UserResponse
 from app.dependencies import get_current_active_user, get_db
 from app.services.song_service import SongService
+from app.services.job_service import job_runner
+from app.lib.admission import admission
+from app.lib.media_response import media_response
+from app.lib.media_store import media_store
+from app.lib.quota import quota
+from app.lib.response_cache import response_cache
+from app.lib.suno import SunoApiError
 from app.lib.utils import  logger
 
 router = APIRouter()
 
 @router.get("/get_file/{file_type}/{file_name}/{flag}")
-async def get_file(file_type: str, file_name: str, flag: str = None, db: Session = Depends(get_db),):
-    # 定义文件所在的目录
-    base_dir = "OUTPUT"
-    
-    # 拼接文件路径
-    file_path = os.path.join(base_dir, file_type, file_name)
-    
-    # 检查文件是否存在
-    if not os.path.exists(file_path):
-        logger.error(f"File not found: {file_path}")
+async def get_file(request: Request, file_type: str, file_name: str, flag: str = None, db: AsyncSession = Depends(get_db),):
+    song_service = SongService()
+    # 本地存储直接返回文件；对象存储返回预签名地址；尚未入库的媒体重定向到上游地址
+    file_path, redirect_url = await song_service.resolve_file(db, file_type, file_name)
+    response = None
+    if file_path is not None:
+        file_key = os.path.basename(file_path)
+        response = await media_response(request, file_path, file_key if media_store.is_key(file_key) else None)
+    elif redirect_url is not None:
+        response = RedirectResponse(redirect_url, status_code=307)
+    if response is None:
+        logger.error(f"File not found: {file_type}/{file_name}")
         raise HTTPException(status_code=555, detail="File not found")
-    
+
     # 如果flag为download，则记录日志
     if flag == "download":
-        song_service = SongService()
-        await song_service.log_download(db, file_name)
-        
+        await song_service.log_download(db, file_type, file_name)
+
     # 返回文件响应
-    return FileResponse(file_path)
+    return response
 
 # 生成歌曲
 @router.post("/generate", response_model=list[SongResponse])
 async def generate(
     generate_request: GenerateRequest = Body(...),
     current_user: UserResponse = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Generates a new song based on provided details.
@@ -55,7 +63,7 @@ async def generate(
 async def custom_generate(
     custom_generate_request: CustomGenerateRequest = Body(...),
     current_user: UserResponse = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Generates a custom song based on provided details.
@@ -68,26 +76,130 @@ async def custom_generate(
     else:
         raise HTTPException(status_code=408, detail="Custom song generation timed out")
 
+# 以 SSE 推送生成进度
+@router.post("/generate_stream")
+async def generate_stream(
+    generate_request: GenerateRequest = Body(...),
+    current_user: UserResponse = Depends(get_current_active_user),
+):
+    """
+    Generates a new song and streams its progress as Server-Sent Events.
+    """
+    admission.ensure_capacity()
+    await quota.ensure_available(current_user)
+    song_service = SongService()
+    # 提交并建任务后再开始推送；生成由后台任务完成，客户端断开不影响
+    try:
+        job, audios = await song_service.create_generate_job(generate_request, current_user)
+    except SunoApiError as e:
+        logger.error(f"Error submitting songs: {e}")
+        raise HTTPException(status_code=502, detail="Song generation failed")
+    job_runner.enqueue(job.id)
+    return StreamingResponse(
+        song_service.stream_job(job, audios),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# 以 SSE 推送自定义生成进度
+@router.post("/custom_generate_stream")
+async def custom_generate_stream(
+    custom_generate_request: CustomGenerateRequest = Body(...),
+    current_user: UserResponse = Depends(get_current_active_user),
+):
+    """
+    Generates a custom song and streams its progress as Server-Sent Events.
+    """
+    admission.ensure_capacity()
+    await quota.ensure_available(current_user)
+    song_service = SongService()
+    # 提交并建任务后再开始推送；生成由后台任务完成，客户端断开不影响
+    try:
+        job, audios = await song_service.create_custom_generate_job(custom_generate_request, current_user)
+    except SunoApiError as e:
+        logger.error(f"Error submitting songs: {e}")
+        raise HTTPException(status_code=502, detail="Custom song generation failed")
+    job_runner.enqueue(job.id)
+    return StreamingResponse(
+        song_service.stream_job(job, audios),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# 提交生成任务，立即返回任务 id
+@router.post("/generate_async", response_model=JobResponse)
+async def generate_async(
+    generate_request: GenerateRequest = Body(...),
+    current_user: UserResponse = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Submits a song generation job and returns its job ID without waiting for the audio.
+    """
+    song_service = SongService()
+    try:
+        job = await song_service.submit_generate(db, generate_request, current_user)
+    except SunoApiError as e:
+        logger.error(f"Error submitting songs: {e}")
+        raise HTTPException(status_code=502, detail="Song generation failed")
+    job_runner.enqueue(job.jobId)
+    return job
+
+# 提交自定义生成任务
+@router.post("/custom_generate_async", response_model=JobResponse)
+async def custom_generate_async(
+    custom_generate_request: CustomGenerateRequest = Body(...),
+    current_user: UserResponse = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Submits a custom song generation job and returns its job ID without waiting for the audio.
+    """
+    song_service = SongService()
+    try:
+        job = await song_service.submit_custom_generate(db, custom_generate_request, current_user)
+    except SunoApiError as e:
+        logger.error(f"Error submitting songs: {e}")
+        raise HTTPException(status_code=502, detail="Custom song generation failed")
+    job_runner.enqueue(job.jobId)
+    return job
+
+# 查询生成任务状态
+@router.get("/job/{job_id}", response_model=JobResponse)
+async def job_status(
+    job_id: str,
+    current_user: UserResponse = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Retrieves the progress of a generation job, including its songs once complete.
+    """
+    song_service = SongService()
+    job = await song_service.get_job(db, job_id, current_user)
+    if not job:
+        raise HTTPException(status_code=555, detail="Job not found")
+    return job
+
 # 获取歌曲列表
 @router.post("/song_list", response_model=SongListResponse)
 async def song_list(
     list_request: SongListRequest = Body(...),
     current_user: UserResponse = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Retrieves a list of songs with pagination.
     """
     song_service = SongService()
-    response = await song_service.get_song_list(db, list_request, current_user)
-    return response
+    body = await response_cache.fetch(current_user.id, "song_list", list_request, lambda: song_service.get_song_list(db, list_request, current_user))
+    return Response(content=body, media_type="application/json")
 
 # 删除歌曲
 @router.post("/delete_song", response_model=DeleteSongResponse)
 async def delete_song(
     delete_request: DeleteSongRequest = Body(...),
     current_user: UserResponse = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 
 ):
     """
@@ -103,23 +215,23 @@ async def delete_song(
 async def song_info(
     info_request: SongInfoRequest = Body(...),
     current_user: UserResponse = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 
 ):
     """
     Retrieves detailed information about a specific song.
     """
     song_service = SongService()
-    song_info = await song_service.get_song_info(db, info_request, current_user)
-    if not song_info:
+    body = await response_cache.fetch(current_user.id, "song_info", info_request, lambda: song_service.get_song_info(db, info_request, current_user))
+    if body is None:
         raise HTTPException(status_code=555, detail="Song not found")
-    return song_info
+    return Response(content=body, media_type="application/json")
 
 # 获取积分
 @router.get("/get_credits", response_model=CreditsResponse)
 async def get_credits(
     current_user: UserResponse = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 
 ):
     """
@@ -37,6 +37,7 @@ class SongResponse(SongBase):
 class SongListResponse(BaseModel):
     songsList: List[SongResponse] = Field(description="List of songs")
     total: int = Field(description="Total number of songs")
+    nextCursor: Optional[int] = Field(default=None, description="Cursor for the next page, None on the last page")
 
 class DeleteSongRequest(BaseModel):
     id: int = Field(description="Unique identifier of the song to be deleted")
@@ -85,7 +86,12 @@ class CustomGenerateRequest(BaseModel):
     instrumentalState: bool = Field(description="State if the song is instrumental or not")
 
 class SongListRequest(BaseModel):
-    pageSize: int = Field(description="Number of songs per page")
-    pageNum: int = Field(description="Page number to fetch")
-
-
+    pageSize: int = Field(gt=0, le=500, description="Number of songs per page")
+    pageNum: int = Field(default=1, ge=1, description="Page number to fetch, ignored when cursor is set")
+    cursor: Optional[int] = Field(default=None, description="nextCursor from the previous page")
+
+class JobResponse(BaseModel):
+    jobId: str = Field(description="Unique identifier of the generation job")
+    status: str = Field(description="Job status: pending, running, complete or failed")
+    error: Optional[str] = Field(default=None, description="Failure reason, if any")
+    songsList: List[SongResponse] = Field(default=[], description="Generated songs once the job is complete")
@@ -0,0 +1,18 @@
+from datetime import date
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class UsageDailyResponse(BaseModel):
+    day: date = Field(description="Day the usage was recorded")
+    studio_id: Optional[int] = Field(default=None, description="Studio, None for songs without one")
+    studio_name: Optional[str] = Field(default=None, description="Studio name")
+    team_id: Optional[int] = Field(default=None, description="Team, None for songs without one")
+    team_name: Optional[str] = Field(default=None, description="Team name")
+    songs: int = Field(description="Songs generated that day")
+    downloads: int = Field(description="Song downloads that day")
+
+class UsageTotalResponse(BaseModel):
+    id: Optional[int] = Field(default=None, description="Studio or team id, None for unassigned usage")
+    name: Optional[str] = Field(default=None, description="Studio or team name")
+    songs: int = Field(description="Songs generated in the range")
+    downloads: int = Field(description="Song downloads in the range")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from app.models.table import User, Studio, Team
 
 class StudioResponse(BaseModel):
@@ -18,6 +18,16 @@ class TeamResponse(BaseModel):
     def from_orm(cls, team: Team):
         return cls(id=team.id, name=team.name)
 
+class TeamDirectoryResponse(TeamResponse):
+    studio: Optional[StudioResponse] = None
+    member_count: int = 0
+    song_count: int = 0
+
+class StudioDirectoryResponse(StudioResponse):
+    team_count: int = 0
+    member_count: int = 0
+    song_count: int = 0
+
 class UserBase(BaseModel):
     name: Optional[str] = None
     job_name: Optional[str] = None
@@ -34,6 +44,7 @@ class UserUpdate(UserBase):
 class UserResponse(UserBase):
     id: int
     is_active: bool
+    power: int = 0
     studio: Optional[StudioResponse] = None
     team: Optional[TeamResponse] = None
 
@@ -53,6 +64,7 @@ class UserResponse(UserBase):
             job_number=user.job_number,
             avatar_url=user.avatar_url,
             is_active=user.is_active,
+            power=user.power or 0,
             studio=studio,
             team=team
         )
@@ -0,0 +1,173 @@
+# app/services/ingest_service.py
+import asyncio, os, time
+from datetime import datetime
+from typing import List, Optional, Set, Tuple
+from urllib.parse import urlparse
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.lib.downloader import DownloadResult, media_downloader
+from app.lib.lease import WORKER_ID, hold_lease, lease_expiry
+from app.lib.media_store import media_store
+from app.lib.metrics import GENERATION_STAGE_LATENCY
+from app.lib.response_cache import response_cache
+from app.lib.utils import logger
+from app.models.table import Song
+from app.utils.database import AsyncSessionLocal
+from config.settings import Setting
+
+def media_filenames(clip_id: str, image_url: Optional[str]) -> Tuple[str, str]:
+    """
+    Local file names for a clip's cover and audio, keyed by the Suno clip id
+    so they do not depend on which upstream URL (streaming or CDN) was seen.
+    """
+    image_ext = os.path.splitext(urlparse(image_url).path)[1] if image_url else ""
+    return f"{clip_id}{image_ext or '.jpeg'}", f"{clip_id}.mp3"
+
+class IngestPipeline:
+    """
+    Background media ingest for saved songs.
+
+    Song rows are committed with their upstream URLs and `media_status`
+    "pending"; workers here download cover and audio into the
+    content-addressed media store, point the row's URLs at the stored keys
+    and mark it "ready". Audio may still be a streaming URL, in which case the
+    download follows the stream until Suno finishes the clip.
+
+    A worker claims a song by moving it from "pending" to "ingesting" with a
+    conditional update and renews its lease while downloading; the result is
+    committed only while the lease is still held (and the song not deleted),
+    so a song's media is never referenced twice. Pending songs and songs
+    whose worker went away are picked up on startup and then once per lease
+    period, when unreferenced media objects are collected as well.
+    """
+
+    def __init__(self, workers: int = Setting.INGEST_WORKERS, lease_ttl: float = Setting.INGEST_LEASE_TTL):
+        self.workers = workers
+        self.lease_ttl = lease_ttl
+        self.queue: Optional[asyncio.Queue] = None
+        self._queued: Set[int] = set()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self.queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        await self.resume_pending()
+        self._tasks.append(asyncio.create_task(self._reap()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, song_id: int) -> None:
+        # 同一首歌在本进程队列中只排一次；能否执行由认领决定
+        if song_id not in self._queued:
+            self._queued.add(song_id)
+            self.queue.put_nowait(song_id)
+
+    def enqueue_songs(self, songs: List[Song]) -> None:
+        for song in songs:
+            self.enqueue(song.id)
+
+    @staticmethod
+    def _claimable():
+        expired = or_(Song.media_lease_until.is_(None), Song.media_lease_until < datetime.now())
+        # 已删除的歌曲不再入库
+        return and_(Song.is_active == True, or_(Song.media_status == "pending", and_(Song.media_status == "ingesting", expired)))
+
+    async def resume_pending(self) -> None:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(Song.id).where(Song.media_status.in_(("pending", "ingesting")), self._claimable()).order_by(Song.id))
+            song_ids = [song_id for song_id in result.scalars().all() if song_id not in self._queued]
+        for song_id in song_ids:
+            self.enqueue(song_id)
+        if song_ids:
+            logger.info(f"Resumed media ingest for {len(song_ids)} songs")
+
+    async def _reap(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_ttl)
+            try:
+                await self.resume_pending()
+                await media_store.collect()
+            except Exception as e:
+                logger.error(f"Failed to resume media ingest: {e!r}")
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            song_id = await self.queue.get()
+            self._queued.discard(song_id)
+            try:
+                await self.ingest(song_id)
+            except Exception as e:
+                logger.error(f"Ingest worker {index} failed on song {song_id}: {e!r}")
+            finally:
+                self.queue.task_done()
+
+    @staticmethod
+    async def _download(url: str, kind: str) -> DownloadResult:
+        upload = await media_store.storage.open_upload()
+        return await media_downloader.download(url, upload, kind)
+
+    async def download_files(self, db: AsyncSession, song: Song) -> None:
+        image_filename, audio_filename = media_filenames(song.clip_id, song.source_image_url)
+        sources = [("audios", song.source_audio_url, audio_filename)]
+        if song.source_image_url:
+            sources.append(("images", song.source_image_url, image_filename))
+        # 边下载边写入存储后端的暂存对象，完成后按内容哈希归档
+        results = await asyncio.gather(*(self._download(url, kind) for kind, url, _ in sources))
+        for (kind, _, filename), result in zip(sources, results):
+            key = await media_store.put(db, kind, result, os.path.splitext(filename)[1])
+            if kind == "audios":
+                song.audio_key = key
+                song.audio_url = f"/api/get_file/audios/{key}"
+            else:
+                song.image_key = key
+                song.image_url = f"/api/get_file/images/{key}"
+
+    async def _claim(self, song_id: int) -> bool:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(Song).where(Song.id == song_id, self._claimable())
+                .values(media_status="ingesting", media_owner=WORKER_ID, media_lease_until=lease_expiry(self.lease_ttl))
+            )
+            await db.commit()
+        return result.rowcount == 1
+
+    @staticmethod
+    async def _finish(db: AsyncSession, song_id: int, media_status: str) -> bool:
+        # 仅在仍持有租约时写入结果；失败说明已被其他 worker 接手
+        result = await db.execute(
+            update(Song)
+            .where(Song.id == song_id, Song.media_status == "ingesting", Song.media_owner == WORKER_ID, Song.is_active == True)
+            .values(media_status=media_status, media_owner=None, media_lease_until=None)
+        )
+        return result.rowcount == 1
+
+    async def ingest(self, song_id: int) -> None:
+        if not await self._claim(song_id):
+            return
+        lease = hold_lease(Song.id, song_id, Song.media_owner, Song.media_lease_until, self.lease_ttl)
+        async with AsyncSessionLocal() as db, lease:
+            song = await db.get(Song, song_id)
+            user_id = song.user_id
+            start = time.perf_counter()
+            try:
+                await self.download_files(db, song)
+                if not await self._finish(db, song_id, "ready"):
+                    # 租约已失去或歌曲已删除：回滚后引用不落库
+                    await db.rollback()
+                    logger.warning(f"Song {song_id} was taken over or deleted during ingest, discarding its media")
+                    return
+            except Exception as e:
+                logger.error(f"Failed to ingest media for song {song_id}: {e!r}")
+                await db.rollback()
+                await self._finish(db, song_id, "failed")
+            GENERATION_STAGE_LATENCY.labels(stage="download").observe(time.perf_counter() - start)
+            await db.commit()
+            # 媒体地址已改写，使该用户缓存的列表与详情失效
+            await response_cache.invalidate(user_id)
+
+ingest_pipeline = IngestPipeline()
@@ -0,0 +1,147 @@
+# app/services/job_service.py
+import asyncio
+from datetime import datetime
+from typing import List, Optional, Set
+
+from app.lib.lease import WORKER_ID, hold_lease, lease_expiry
+from app.lib.response_cache import response_cache
+from app.lib.suno_pool import suno_pool
+from app.lib.utils import logger
+from app.models.table import GenerationJob
+from app.services.ingest_service import ingest_pipeline
+from app.services.song_service import SongService
+from app.services.user_service import get_user_by_id
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.utils.database import AsyncSessionLocal
+from config.settings import Setting
+
+class JobRunner:
+    """
+    Background runner that drives submitted generation jobs through
+    polling, download and `save_songs`. Job state lives in `generation_jobs`.
+
+    Each job runs as its own task; most of its time is spent waiting on the
+    Suno poll, so a semaphore of `concurrency` (by default as many
+    generations as admission lets in at once, running or queued) bounds the
+    jobs in flight instead of a fixed pool of blocking workers.
+
+    A job is claimed with a conditional update (pending, or running under an
+    expired lease) and its lease is renewed while it runs. The songs and the
+    final status are committed only while the lease is still held, so a job
+    taken over from a stalled worker is never saved twice. `resume_pending`
+    runs on startup and then once per lease period, picking up new jobs and
+    jobs whose worker went away.
+    """
+
+    def __init__(self, concurrency: int = Setting.JOB_CONCURRENCY, lease_ttl: float = Setting.JOB_LEASE_TTL):
+        self.concurrency = concurrency
+        self.lease_ttl = lease_ttl
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._queued: Set[str] = set()
+        self._jobs: Set[asyncio.Task] = set()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        await self.resume_pending()
+        self._tasks = [asyncio.create_task(self._reap())]
+
+    async def stop(self) -> None:
+        tasks = self._tasks + list(self._jobs)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, job_id: str) -> None:
+        # 同一任务在本进程只排一次；能否执行由认领决定
+        if job_id not in self._queued:
+            self._queued.add(job_id)
+            task = asyncio.create_task(self._run(job_id))
+            self._jobs.add(task)
+            task.add_done_callback(self._jobs.discard)
+
+    @staticmethod
+    def _claimable():
+        expired = or_(GenerationJob.lease_until.is_(None), GenerationJob.lease_until < datetime.now())
+        return or_(GenerationJob.status == "pending", and_(GenerationJob.status == "running", expired))
+
+    async def resume_pending(self) -> None:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(GenerationJob.id).where(self._claimable()).order_by(GenerationJob.created_at))
+            jobs = [job_id for job_id in result.scalars().all() if job_id not in self._queued]
+        for job_id in jobs:
+            self.enqueue(job_id)
+        if jobs:
+            logger.info(f"Resumed {len(jobs)} pending generation jobs")
+
+    async def _reap(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_ttl)
+            try:
+                await self.resume_pending()
+            except Exception as e:
+                logger.error(f"Failed to resume generation jobs: {e!r}")
+
+    async def _run(self, job_id: str) -> None:
+        try:
+            async with self._semaphore:
+                await self.run_job(job_id)
+        except Exception as e:
+            logger.error(f"Generation job {job_id} crashed: {e!r}")
+        finally:
+            self._queued.discard(job_id)
+
+    async def _claim(self, job_id: str) -> bool:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(GenerationJob).where(GenerationJob.id == job_id, self._claimable())
+                .values(status="running", owner=WORKER_ID, lease_until=lease_expiry(self.lease_ttl))
+            )
+            await db.commit()
+        return result.rowcount == 1
+
+    @staticmethod
+    async def _finish(db: AsyncSession, job_id: str, **values) -> bool:
+        # 仅在仍持有租约时写入结果；失败说明任务已被其他 worker 接手
+        result = await db.execute(
+            update(GenerationJob)
+            .where(GenerationJob.id == job_id, GenerationJob.status == "running", GenerationJob.owner == WORKER_ID)
+            .values(owner=None, lease_until=None, **values)
+        )
+        return result.rowcount == 1
+
+    async def run_job(self, job_id: str) -> None:
+        if not await self._claim(job_id):
+            return
+        lease = hold_lease(GenerationJob.id, job_id, GenerationJob.owner, GenerationJob.lease_until, self.lease_ttl)
+        async with AsyncSessionLocal() as db, lease:
+            job = await db.get(GenerationJob, job_id)
+            try:
+                user = await get_user_by_id(db, job.user_id)
+                if user is None:
+                    raise Exception("User not found")
+                # clip 只能在提交它的账号下查询
+                async with suno_pool.acquire(job.account) as account:
+                    audios = await account.api.wait_songs(job.clip_ids.split(","), playable=True)
+                # 歌曲与任务状态同一事务提交
+                songs = await SongService().save_songs(db, job.title, audios, user, False)
+                if not songs:
+                    raise Exception("Song generation timed out")
+                if not await self._finish(db, job_id, status="complete", error=None, song_ids=",".join(str(song.id) for song in songs)):
+                    await db.rollback()
+                    logger.warning(f"Lost the lease on generation job {job_id}, discarding its songs")
+                    return
+                await db.commit()
+                await response_cache.invalidate(user.id)
+                ingest_pipeline.enqueue_songs(songs)
+            except Exception as e:
+                await db.rollback()
+                # clip 已在 Suno 生成并扣费，失败也不归还额度
+                if await self._finish(db, job_id, status="failed", error=str(e)):
+                    await db.commit()
+                logger.error(f"Generation job {job_id} failed: {e}")
+
+job_runner = JobRunner()
@@ -0,0 +1,85 @@
+# app/services/log_service.py
+import asyncio
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import insert
+
+from app.lib.utils import logger
+from app.models.table import Log
+from app.utils.database import AsyncSessionLocal
+from config.settings import Setting
+
+class LogWriter:
+    """
+    Buffered audit-log writer. Request handlers hand rows to `write`, which
+    never blocks; a background task bulk-inserts them into `logs` once
+    `LOG_BATCH_SIZE` rows are buffered or `LOG_FLUSH_INTERVAL` seconds have
+    passed since the first one. `stop` flushes whatever is still queued.
+    When the buffer is full (database down or far behind) rows are dropped
+    rather than slowing the request down.
+    """
+
+    def __init__(self, batch_size: int = Setting.LOG_BATCH_SIZE, interval: float = Setting.LOG_FLUSH_INTERVAL,
+                 queue_limit: int = Setting.LOG_QUEUE_LIMIT):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue_limit = queue_limit
+        self.queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self.queue = asyncio.Queue(maxsize=self.queue_limit)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        # 哨兵让写入循环处理完队列中剩余的记录后退出
+        await self.queue.put(None)
+        await self._task
+        self._task = None
+
+    def write(self, song_id: int, user_id: int, action: str, message: str) -> None:
+        if self._task is None:
+            logger.warning(f"Log writer not running, dropping {action} log for song {song_id}")
+            return
+        row = dict(song_id=song_id, user_id=user_id, action=action, message=message, created_at=datetime.now())
+        try:
+            self.queue.put_nowait(row)
+        except asyncio.QueueFull:
+            logger.warning(f"Log buffer full, dropping {action} log for song {song_id}")
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            row = await self.queue.get()
+            if row is None:
+                return
+            batch = [row]
+            deadline = loop.time() + self.interval
+            stopping = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch: List[dict]) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(Log), batch)
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} log rows: {e!r}")
+
+log_writer = LogWriter()
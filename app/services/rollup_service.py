@@ -0,0 +1,151 @@
+# app/services/rollup_service.py
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.lib.utils import logger
+from app.models.table import Log, RollupWatermark, Song, Studio, Team, UsageDaily
+from app.schemas.stats import UsageDailyResponse, UsageTotalResponse
+from app.utils.database import AsyncSessionLocal, upsert
+from config.settings import Setting
+
+class UsageRollup:
+    """
+    Periodic job that folds new `songs` and `logs` rows into `usage_daily`.
+
+    Each source has a watermark in `rollup_watermarks`. A run aggregates the
+    ids between the watermark and the newest row older than `ROLLUP_LAG`
+    (at most `ROLLUP_BATCH` rows), adds the counts to the rollup and moves
+    the watermark in the same transaction, so every row is counted once.
+    The watermark row is locked for the run, so several workers can run the
+    job side by side. The lag leaves time for transactions that took a
+    lower id but had not committed yet.
+    """
+    SOURCES = ("songs", "logs")
+
+    def __init__(self, interval: float = Setting.ROLLUP_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                # 积压较多时连续追赶，追平后按间隔执行
+                while await self.run_once():
+                    pass
+            except Exception as e:
+                logger.error(f"Usage rollup failed: {e!r}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> bool:
+        """
+        Roll up one batch per source; True if either source hit the batch cap.
+        """
+        behind = False
+        for source in self.SOURCES:
+            async with AsyncSessionLocal() as db:
+                behind |= await self._roll(db, source)
+        return behind
+
+    @staticmethod
+    def _day(value) -> date:
+        # SQLite 的 date() 返回字符串
+        return date.fromisoformat(value) if isinstance(value, str) else value
+
+    async def _roll(self, db: AsyncSession, source: str) -> bool:
+        await db.execute(upsert(RollupWatermark, {"name": source, "last_id": 0}, ["name"]))
+        last_id = await db.scalar(select(RollupWatermark.last_id).where(RollupWatermark.name == source).with_for_update())
+        model = Song if source == "songs" else Log
+        cutoff = datetime.now() - timedelta(seconds=Setting.ROLLUP_LAG)
+        batch = (
+            select(model.id).where(model.id > last_id, model.created_at < cutoff)
+            .order_by(model.id).limit(Setting.ROLLUP_BATCH).subquery()
+        )
+        upper, size = (await db.execute(select(func.max(batch.c.id), func.count()).select_from(batch))).one()
+        if upper is None:
+            await db.commit()
+            return False
+
+        if source == "songs":
+            rows = await db.execute(
+                select(func.date(Song.created_at), func.coalesce(Song.studio_id, 0), func.coalesce(Song.team_id, 0), func.count())
+                .where(Song.id > last_id, Song.id <= upper)
+                .group_by(func.date(Song.created_at), func.coalesce(Song.studio_id, 0), func.coalesce(Song.team_id, 0))
+            )
+        else:
+            rows = await db.execute(
+                select(func.date(Log.created_at), func.coalesce(Song.studio_id, 0), func.coalesce(Song.team_id, 0), func.count())
+                .join(Song, Song.id == Log.song_id)
+                .where(Log.id > last_id, Log.id <= upper, Log.action == "download")
+                .group_by(func.date(Log.created_at), func.coalesce(Song.studio_id, 0), func.coalesce(Song.team_id, 0))
+            )
+        values = [
+            {"day": self._day(day), "studio_id": studio_id, "team_id": team_id,
+             "songs": count if source == "songs" else 0, "downloads": count if source == "logs" else 0}
+            for day, studio_id, team_id, count in rows.all()
+        ]
+        if values:
+            column = UsageDaily.songs if source == "songs" else UsageDaily.downloads
+            await db.execute(upsert(
+                UsageDaily, values, ["day", "studio_id", "team_id"],
+                lambda excluded: {column.key: column + excluded[column.key]},
+            ))
+        await db.execute(update(RollupWatermark).where(RollupWatermark.name == source).values(last_id=upper))
+        await db.commit()
+        return size >= Setting.ROLLUP_BATCH
+
+usage_rollup = UsageRollup()
+
+def _usage_filters(query, start: date, end: date, studio_id: Optional[int], team_id: Optional[int]):
+    query = query.where(UsageDaily.day >= start, UsageDaily.day <= end)
+    if studio_id is not None:
+        query = query.where(UsageDaily.studio_id == studio_id)
+    if team_id is not None:
+        query = query.where(UsageDaily.team_id == team_id)
+    return query
+
+async def get_daily_usage(db: AsyncSession, start: date, end: date, studio_id: Optional[int] = None,
+                          team_id: Optional[int] = None) -> List[UsageDailyResponse]:
+    query = (
+        select(UsageDaily, Studio.name, Team.name)
+        .outerjoin(Studio, Studio.id == UsageDaily.studio_id)
+        .outerjoin(Team, Team.id == UsageDaily.team_id)
+        .order_by(UsageDaily.day, UsageDaily.studio_id, UsageDaily.team_id)
+    )
+    result = await db.execute(_usage_filters(query, start, end, studio_id, team_id))
+    return [
+        UsageDailyResponse(
+            day=usage.day, studio_id=usage.studio_id or None, studio_name=studio_name,
+            team_id=usage.team_id or None, team_name=team_name, songs=usage.songs, downloads=usage.downloads,
+        )
+        for usage, studio_name, team_name in result.all()
+    ]
+
+async def get_usage_totals(db: AsyncSession, group: str, start: date, end: date,
+                           studio_id: Optional[int] = None) -> List[UsageTotalResponse]:
+    """
+    Usage summed over [start, end] per studio or per team (`group`).
+    """
+    key, dimension = (UsageDaily.studio_id, Studio) if group == "studio" else (UsageDaily.team_id, Team)
+    query = (
+        select(key, dimension.name, func.sum(UsageDaily.songs), func.sum(UsageDaily.downloads))
+        .outerjoin(dimension, dimension.id == key)
+        .group_by(key, dimension.name)
+        .order_by(key)
+    )
+    result = await db.execute(_usage_filters(query, start, end, studio_id, None))
+    return [
+        UsageTotalResponse(id=group_id or None, name=name, songs=songs or 0, downloads=downloads or 0)
+        for group_id, name, songs, downloads in result.all()
+    ]
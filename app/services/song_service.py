@@ -1,187 +1,293 @@
 # app/services/song_service.py
-import os, threading
-from tqdm import tqdm
-import requests, asyncio
-from concurrent.futures import ThreadPoolExecutor, Future
-from typing import List
-from datetime import datetime, date
-from sqlalchemy.orm import Session
+import os, uuid
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+from datetime import datetime
+from cachetools import TTLCache
+from sqlalchemy import bindparam, or_, select, func, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.lib.admission import admission
+from app.lib.media_response import stat_cache
+from app.lib.media_store import media_store
+from app.lib.quota import quota
+from app.lib.response_cache import response_cache
 from app.lib.suno import SunoApi, AudioInfo
-from app.lib.utils import logger
-from app.models.table import Song, Log
+from app.lib.suno_pool import suno_pool
+from app.lib.utils import logger, sse_event
+from app.models.table import Song, GenerationJob, UserSongCount
+from app.services.ingest_service import ingest_pipeline, media_filenames
+from app.services.log_service import log_writer
+from app.utils.database import AsyncSessionLocal, upsert
 from app.schemas.user import UserResponse
 from app.schemas.song import *
 from config.settings import Setting
 
-class SongService:
-    def __init__(self, max_concurrent_tasks: int=2):
-        self.semaphore = asyncio.Semaphore(max_concurrent_tasks)
+# /song_list 与 /song_info 只读取响应里用到的列，键名与 SongResponse / SongInfoResponse 一致
+SONG_LIST_COLUMNS = (Song.id, Song.title, Song.image_url, Song.audio_url, Song.tags, Song.make_instrumental)
+SONG_INFO_COLUMNS = (
+    Song.id, Song.image_url, Song.title, Song.tags, Song.created_at,
+    Song.gpt_description_prompt.label("prompt"), Song.lyrics,
+)
+# /song_info 只取一行，构造语句与生成缓存键的开销占比大，语句只建一次、按参数执行
+SONG_INFO_QUERY = select(*SONG_INFO_COLUMNS).where(
+    Song.id == bindparam("song_id"), Song.user_id == bindparam("user_id"), Song.is_active == True,
+)
+# /get_file 的 clip id 文件名 -> (内容键, 上游地址)，进程内共享
+clip_key_cache = TTLCache(maxsize=Setting.MEDIA_KEY_CACHE_SIZE, ttl=Setting.MEDIA_KEY_CACHE_TTL)
 
-    async def generate_and_wait(self, db: Session, request: GenerateRequest, user: UserResponse) -> List[dict]:
-        async with self.semaphore:
-            suno_api = await SunoApi(cookie=Setting.COOKIE).init()
+class SongService:
+    async def generate_and_wait(self, db: AsyncSession, request: GenerateRequest, user: UserResponse) -> List[dict]:
+        async with quota.reserve(user) as reservation, admission.slot(user), suno_pool.acquire() as account:
             logger.info(f"Generating song with description: {request.songDescription}")
-            audios = await suno_api.generate(request.songDescription, request.songTitle, request.instrumentalState, True)
-            
-            # 创建一个新的线程来执行 save_songs 方法
-            save_thread = threading.Thread(target=self.save_songs, args=(db, request.songTitle, audios, user, ))
-            save_thread.start()
-            
-            # 等待线程完成
-            save_thread.join()
-            
-            songs = db.query(Song).filter(Song.title == request.songTitle, Song.user_id == user.id).order_by(Song.id.desc()).limit(2).all()
-            for song in songs:
-                db.refresh(song)
-            return songs
+            audios = await account.api.generate(request.songDescription, request.songTitle, request.instrumentalState, False)
+            # Suno 已受理，之后的失败不再归还额度
+            reservation.spend()
+            suno_pool.charge(account)
+            audios = await account.api.wait_songs([audio.id for audio in audios], playable=True)
+            return await self.save_songs(db, request.songTitle, audios, user)
 
-    async def custom_generate_and_wait(self, db: Session, request: CustomGenerateRequest, user: UserResponse) -> List[dict]:
-        async with self.semaphore:
-            suno_api = await SunoApi(cookie=Setting.COOKIE).init()
+    async def custom_generate_and_wait(self, db: AsyncSession, request: CustomGenerateRequest, user: UserResponse) -> List[dict]:
+        async with quota.reserve(user) as reservation, admission.slot(user), suno_pool.acquire() as account:
             logger.info(f"Generating custom song with lyrics: {request.songLyrics}")
-            audios = await suno_api.custom_generate(request.songLyrics, request.songStyles, request.songTitle, request.instrumentalState, True)
-            
-            # 创建一个新的线程来执行 save_songs 方法
-            save_thread = threading.Thread(target=self.save_songs, args=(db, request.songTitle, audios, user, ))
-            save_thread.start()
-            
-            # 等待线程完成
-            save_thread.join()
-            
-            songs = db.query(Song).filter(Song.title == request.songTitle, Song.user_id == user.id).order_by(Song.id.desc()).limit(2).all()
-            for song in songs:
-                db.refresh(song)
-            return songs
+            audios = await account.api.custom_generate(request.songLyrics, request.songStyles, request.songTitle, request.instrumentalState, False)
+            # Suno 已受理，之后的失败不再归还额度
+            reservation.spend()
+            suno_pool.charge(account)
+            audios = await account.api.wait_songs([audio.id for audio in audios], playable=True)
+            return await self.save_songs(db, request.songTitle, audios, user)
+
+    async def submit_generate(self, db: AsyncSession, request: GenerateRequest, user: UserResponse) -> JobResponse:
+        job, _ = await self.create_generate_job(request, user)
+        return await self.job_response(db, job)
+
+    async def submit_custom_generate(self, db: AsyncSession, request: CustomGenerateRequest, user: UserResponse) -> JobResponse:
+        job, _ = await self.create_custom_generate_job(request, user)
+        return await self.job_response(db, job)
+
+    async def create_generate_job(self, request: GenerateRequest, user: UserResponse) -> Tuple[GenerationJob, List[AudioInfo]]:
+        logger.info(f"Submitting song job with description: {request.songDescription}")
+        submit = lambda suno_api: suno_api.generate(request.songDescription, request.songTitle, request.instrumentalState, False)
+        return await self._submit_job("generate", request.songTitle, submit, user)
 
-    async def get_song_list(self, db: Session, request: SongListRequest, user: UserResponse) -> SongListResponse:
+    async def create_custom_generate_job(self, request: CustomGenerateRequest, user: UserResponse) -> Tuple[GenerationJob, List[AudioInfo]]:
+        logger.info(f"Submitting custom song job with lyrics: {request.songLyrics}")
+        submit = lambda suno_api: suno_api.custom_generate(request.songLyrics, request.songStyles, request.songTitle, request.instrumentalState, False)
+        return await self._submit_job("custom", request.songTitle, submit, user)
+
+    async def _submit_job(self, kind: str, title: str, submit: Callable[[SunoApi], Awaitable[List[AudioInfo]]],
+                          user: UserResponse) -> Tuple[GenerationJob, List[AudioInfo]]:
+        # 提交与建任务在独立任务中完成：客户端中途断开时，已扣费的 clip 仍会记入任务，由后台 worker 接手
+        return await asyncio.shield(asyncio.create_task(self._create_job(kind, title, submit, user)))
+
+    async def _create_job(self, kind: str, title: str, submit: Callable[[SunoApi], Awaitable[List[AudioInfo]]],
+                          user: UserResponse) -> Tuple[GenerationJob, List[AudioInfo]]:
+        async with quota.reserve(user) as reservation, admission.slot(user), suno_pool.acquire() as account:
+            audios = await submit(account.api)
+            # Suno 已受理，之后的失败不再归还额度
+            reservation.spend()
+            suno_pool.charge(account)
+        job = GenerationJob(
+            id=uuid.uuid4().hex,
+            user_id=user.id,
+            account=account.key,
+            kind=kind,
+            title=title,
+            clip_ids=",".join(audio.id for audio in audios),
+            status="pending",
+        )
+        async with AsyncSessionLocal() as db:
+            db.add(job)
+            await db.commit()
+        return job, audios
+
+    async def get_job(self, db: AsyncSession, job_id: str, user: UserResponse) -> Optional[JobResponse]:
+        job = (await db.execute(select(GenerationJob).where(GenerationJob.id == job_id, GenerationJob.user_id == user.id))).scalars().first()
+        if not job:
+            return None
+        return await self.job_response(db, job)
+
+    @staticmethod
+    async def job_response(db: AsyncSession, job: GenerationJob) -> JobResponse:
+        songs = []
+        if job.status == "complete" and job.song_ids:
+            ids = [int(song_id) for song_id in job.song_ids.split(",")]
+            songs = (await db.execute(select(Song).where(Song.id.in_(ids), Song.is_active == True).order_by(Song.id.desc()))).scalars().all()
+        return JobResponse(
+            jobId=job.id,
+            status=job.status,
+            error=job.error,
+            songsList=[SongResponse.from_orm(song) for song in songs],
+        )
+
+    async def stream_job(self, job: GenerationJob, audios: List[AudioInfo]) -> AsyncIterator[str]:
+        """
+        Yield SSE messages for a submitted job: `submitted` with the clips,
+        `status` whenever a clip's status or audio_url changes (including the
+        early streaming audio_url), then `complete` with the songs the job
+        runner saved, or `error`. The job itself runs in the background, so
+        closing the stream loses nothing.
+        """
+        yield sse_event("submitted", [audio.to_dict() for audio in audios])
+
+        # 只读地跟踪 clip 进度；轮询经共享 poller 与后台任务合并
+        account = suno_pool.accounts.get(job.account)
+        if account is not None:
+            seen = {audio.id: (audio.status, audio.audio_url) for audio in audios}
+            try:
+                async for response in account.api.watch_songs(job.clip_ids.split(","), playable=True):
+                    for audio in response:
+                        state = (audio.status, audio.audio_url)
+                        if seen.get(audio.id) != state:
+                            seen[audio.id] = state
+                            yield sse_event("status", audio.to_dict())
+            except Exception as e:
+                logger.warning(f"Failed to follow clips of job {job.id}: {e!r}")
+
+        # 歌曲由后台任务保存，等待任务结束
+        while True:
+            async with AsyncSessionLocal() as db:
+                current = await db.get(GenerationJob, job.id)
+                if current.status in ("complete", "failed"):
+                    response = await self.job_response(db, current)
+                    break
+            await asyncio.sleep(Setting.JOB_STREAM_POLL)
+        if response.status != "complete" or not response.songsList:
+            yield sse_event("error", {"detail": response.error or "Song generation timed out"})
+            return
+        yield sse_event("complete", [song.model_dump() for song in response.songsList])
+
+    async def get_song_list(self, db: AsyncSession, request: SongListRequest, user: UserResponse) -> dict:
+        """
+        One page of the user's songs as plain data in the SongListResponse
+        shape. Only the listed columns are selected, so the TEXT columns are
+        never read and no ORM entities or pydantic models are built.
+        """
         page_size = request.pageSize
         page_num = request.pageNum
 
-        start = (page_num - 1) * page_size
-        logger.info(f"Fetching song list for user {user.name}, page {page_num}")
-        songs = db.query(Song).filter(Song.user_id == user.id, Song.is_active == True).order_by(Song.id.desc()).offset(start).limit(page_size).all()
-        total = db.query(Song).filter(Song.user_id == user.id, Song.is_active == True).count()
-        # Convert Song DB models to SongResponse models
-        songs_response = [SongResponse.from_orm(song) for song in songs]  # Adjust as per the actual Song model attributes
+        logger.info(f"Fetching song list for user {user.name}, page {page_num}, cursor {request.cursor}")
+        query = select(*SONG_LIST_COLUMNS).where(Song.user_id == user.id, Song.is_active == True)
+        # 有游标时按 id 做 keyset 分页；仅传 pageNum 时保持原有 OFFSET 语义
+        if request.cursor is not None:
+            query = query.where(Song.id < request.cursor)
+        elif page_num > 1:
+            query = query.offset((page_num - 1) * page_size)
+        songs = [dict(row._mapping) for row in await db.execute(query.order_by(Song.id.desc()).limit(page_size))]
+        total = await db.scalar(select(UserSongCount.active_songs).where(UserSongCount.user_id == user.id)) or 0
 
-        # Prepare and return the response using the Pydantic model
-        response = SongListResponse(songsList=songs_response, total=total)
-        return response
+        next_cursor = songs[-1]["id"] if songs and len(songs) == page_size else None
+        return {"songsList": songs, "total": total, "nextCursor": next_cursor}
 
-    async def get_song_info(self, db: Session, request: SongInfoRequest, user: UserResponse) -> SongInfoResponse:
+    async def get_song_info(self, db: AsyncSession, request: SongInfoRequest, user: UserResponse) -> Optional[dict]:
         logger.info(f"Fetching song info for song {request.id}, user {user.name}")
-        song = db.query(Song).filter(Song.id == request.id, Song.user_id == user.id, Song.is_active == True).first()
-        if not song:
+        row = (await db.execute(SONG_INFO_QUERY, {"song_id": request.id, "user_id": user.id})).first()
+        if not row:
             return None
-        return SongInfoResponse.from_orm(song)
+        song = dict(row._mapping)
+        song["created_at"] = song["created_at"].strftime('%Y-%m-%d %H:%M:%S') if song["created_at"] else None
+        return song
 
-    async def log_download(self, db: Session, file_name: str):
+    async def log_download(self, db: AsyncSession, file_type: str, file_name: str):
         logger.info(f"Logging download for file {file_name}")
-        song = db.query(Song).filter(Song.audio_url.contains(file_name)).first()
+        # 按内容 key 或 clip_id 走索引定位歌曲；多首歌可能共享同一内容 key，取最早的一首
+        if media_store.is_key(file_name):
+            criterion = (Song.audio_key if file_type == "audios" else Song.image_key) == file_name
+        elif file_type == "audios":
+            # 旧版音频文件名取自上游地址，不一定等于 clip_id，按 audio_url 兜底
+            criterion = or_(Song.clip_id == os.path.splitext(file_name)[0], Song.audio_url == f"/api/get_file/audios/{file_name}")
+        else:
+            criterion = Song.clip_id == os.path.splitext(file_name)[0]
+        result = await db.execute(select(Song.id, Song.user_id, Song.title).where(criterion).order_by(Song.id).limit(1))
+        song = result.first()
         if song:
-            log = Log(song_id=song.id, user_id=song.user_id, action="download", message=f"User downloaded song {song.title}")
-            db.add(log)
-            db.commit()
+            log_writer.write(song.id, song.user_id, "download", f"User downloaded song {song.title}")
 
-    async def delete_song(self, db: Session, request: DeleteSongRequest, user: UserResponse) -> DeleteSongResponse:
+    async def delete_song(self, db: AsyncSession, request: DeleteSongRequest, user: UserResponse) -> DeleteSongResponse:
         logger.info(f"Deleting song {request.id} for user {user.name}")
-        song = db.query(Song).filter(Song.id == request.id, Song.user_id == user.id, Song.is_active == True).first()
+        # 在同一条 UPDATE 中取回媒体 key，与入库完成互斥
+        song = (await db.execute(
+            update(Song).where(Song.id == request.id, Song.user_id == user.id, Song.is_active == True)
+            .values(is_active=False).returning(Song.image_key, Song.audio_key)
+        )).first()
         if song:
-            song.is_active = False
-            db.commit()
+            await media_store.release(db, song.image_key)
+            await media_store.release(db, song.audio_key)
+            await self._adjust_song_count(db, user.id, -1)
+            await db.commit()
+            await response_cache.invalidate(user.id)
             return DeleteSongResponse(code=200, message="Song deleted successfully")
         return DeleteSongResponse(code=555, message="Song not found")
 
-    async def publish_song(self, db: Session, request: PublishSongRequest, user: UserResponse) -> PublishSongResponse:
+    async def publish_song(self, db: AsyncSession, request: PublishSongRequest, user: UserResponse) -> PublishSongResponse:
         logger.info(f"Publishing song {request.id} for user {user.name}")
-        song = db.query(Song).filter(Song.id == request.id, Song.user_id == user.id, Song.is_active == True).first()
+        song = (await db.execute(select(Song).where(Song.id == request.id, Song.user_id == user.id, Song.is_active == True))).scalars().first()
         if song:
             song.is_public = True
-            db.commit()
+            await db.commit()
+            await response_cache.invalidate(user.id)
             return PublishSongResponse(code=200, message="Song published successfully")
         return PublishSongResponse(code=555, message="Song not found")
 
-    async def get_credits(self, db: Session, user: UserResponse) -> CreditsResponse:
-        today = date.today()
-        today_start = datetime.combine(today, datetime.min.time())
-        today_end = datetime.combine(today, datetime.max.time())
-
+    async def get_credits(self, db: AsyncSession, user: UserResponse) -> CreditsResponse:
         logger.info(f"Fetching credits for user {user.name}")
-        count = db.query(Song).filter(
-            Song.user_id == user.id,
-            Song.created_at >= today_start,
-            Song.created_at <= today_end
-        ).count()
-        
-        return CreditsResponse(credits=((10 - count) // 2))
+        return CreditsResponse(credits=await quota.remaining(db, user.id))
 
-    @staticmethod
-    def download_file(url: str, output_path: str) -> None:
-        logger.info(f"Downloading file from {url} to {output_path}")
-        response = requests.get(url, stream=True)
-        total_size = int(response.headers.get("Content-Length", 1024*1500))
-        block_size = 1024  # 1 KB
-
-        with open(output_path, "wb") as f:
-            with tqdm(
-                desc=os.path.basename(output_path),
-                total=total_size,
-                unit="iB",
-                unit_scale=True,
-                unit_divisor=1024,
-                bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}{postfix}]",
-                colour="blue",
-                leave=True,
-            ) as progress_bar:
-                for data in response.iter_content(block_size):
-                    size = f.write(data)
-                    progress_bar.update(size)
-                    progress_bar.set_postfix(file=os.path.basename(output_path), refresh=True)
-
-    def download_files(self, audios: List[AudioInfo]) -> None:
-        logger.info("Downloading audio and image files")
-        with ThreadPoolExecutor() as executor:
-            futures: List[Future] = []
-            for audio in audios:
-                if audio.image_url is None or audio.audio_url is None:
-                    continue
-                image_filename = f'{audio.image_url.split("image_")[1]}'
-                image_path = os.path.join("OUTPUT", "images", image_filename)
-                os.makedirs(os.path.dirname(image_path), exist_ok=True)
+    async def resolve_file(self, db: AsyncSession, file_type: str, file_name: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Resolve a /get_file name to (local path, redirect URL).
 
-                if "=" in audio.audio_url:
-                    audio_filename = f'{audio.audio_url.split("=")[1]}.mp3'
-                else:
-                    audio_filename = f'{audio.audio_url.split("-")[-1]}'
-                audio_path = os.path.join("OUTPUT", "audios", audio_filename)
-                os.makedirs(os.path.dirname(audio_path), exist_ok=True)
+        Content keys map straight onto the media store, which answers with a
+        local path or a presigned URL depending on the backend. Clip-id names
+        go through the song row: its stored key if ingested, otherwise the
+        upstream URL; ingested keys are cached per clip id so repeat hits
+        skip the database. Flat legacy files under MEDIA_ROOT are still
+        served. Existence checks go through `stat_cache` off the event loop.
+        """
+        if media_store.is_key(file_name):
+            return await media_store.locate(file_type, file_name)
 
-                futures.append(executor.submit(self.download_file, audio.image_url, image_path))
-                futures.append(executor.submit(self.download_file, audio.audio_url, audio_path))
+        clip_id = os.path.splitext(file_name)[0]
+        cached = clip_key_cache.get((file_type, clip_id))
+        if cached is not None:
+            key, source_url = cached
+        else:
+            legacy_path = os.path.join(Setting.MEDIA_ROOT, file_type, file_name)
+            if await stat_cache.get(legacy_path) is not None:
+                return legacy_path, None
+            columns = (Song.audio_key, Song.source_audio_url) if file_type == "audios" else (Song.image_key, Song.source_image_url)
+            row = (await db.execute(select(*columns).where(Song.clip_id == clip_id).limit(1))).first()
+            if row is None:
+                return None, None
+            key, source_url = row
+            # 入库完成后键不再变化；未入库的歌曲每次重新查询，以便入库后改走存储
+            if key:
+                clip_key_cache[(file_type, clip_id)] = (key, source_url)
+        file_path, url = await media_store.locate(file_type, key)
+        if file_path is None and url is None:
+            url = source_url
+        return file_path, url
 
-            # 等待所有任务完成
-            for future in futures:
-                future.result()
+    @staticmethod
+    async def _adjust_song_count(db: AsyncSession, user_id: int, delta: int) -> None:
+        # 与歌曲写入在同一事务内更新计数，/song_list 的 total 不再 COUNT
+        await db.execute(upsert(
+            UserSongCount, {"user_id": user_id, "active_songs": delta}, ["user_id"],
+            {"active_songs": UserSongCount.active_songs + delta},
+        ))
 
-    def save_songs(self, db: Session, title: str, audios: List[AudioInfo], user: UserResponse) -> None:
+    async def save_songs(self, db: AsyncSession, title: str, audios: List[AudioInfo], user: UserResponse, commit: bool = True) -> List[Song]:
         logger.info(f"Saving songs with title: {title}")
+        songs: List[Song] = []
         try:
-            self.download_files(audios)
-
             for audio in audios:
-                if audio.image_url is None or audio.audio_url is None:
+                # 没有封面的歌曲照常保存，入库时只下载音频
+                if audio.audio_url is None:
                     continue
-                image_filename = f'{audio.image_url.split("image_")[1]}'
-                if "=" in audio.audio_url:
-                    audio_filename = f'{audio.audio_url.split("=")[1]}'
-                else:
-                    audio_filename = f'{audio.audio_url.split("-")[-1]}'
-                if ".mp3" not in audio_filename:
-                    audio_filename += ".mp3"
+                image_filename, audio_filename = media_filenames(audio.id, audio.image_url)
 
                 # 构建接口的 URL
-                image_url = f"/api/get_file/images/{image_filename}"
+                image_url = f"/api/get_file/images/{image_filename}" if audio.image_url else None
                 audio_url = f"/api/get_file/audios/{audio_filename}"
 
                 song = Song(
@@ -189,9 +295,13 @@ class SongService:
                     studio_id=user.studio.id if user.studio else None,
                     team_id=user.team.id if user.team else None,
                     title=title,
+                    clip_id=audio.id,
                     image_url=image_url,
                     audio_url=audio_url,
                     video_url=audio.video_url,
+                    source_image_url=audio.image_url,
+                    source_audio_url=audio.audio_url,
+                    media_status="pending",
                     model_name=audio.model_name,
                     gpt_description_prompt=audio.gpt_description_prompt,
                     type=audio.type,
@@ -203,8 +313,36 @@ class SongService:
                     is_custom=audio.type == "custom"
                 )
                 db.add(song)
-            db.commit()
+                songs.append(song)
+            if songs:
+                await self._adjust_song_count(db, user.id, len(songs))
+            if commit:
+                await db.commit()
+                await response_cache.invalidate(user.id)
+                # 先提交歌曲记录，媒体文件交给后台入库
+                ingest_pipeline.enqueue_songs(songs)
+            else:
+                await db.flush()
+            return songs
         except Exception as e:
-            db.rollback()  # 在异常发生时回滚
+            await db.rollback()  # 在异常发生时回滚
             logger.error(f"Error saving songs: {e}")
-            raise e
\ No newline at end of file
+            raise e
+
+async def backfill_song_counts() -> None:
+    """
+    Seed `user_song_counts` from `songs` while the table is still empty, i.e.
+    for libraries created before the counter existed. From then on
+    `save_songs` / `delete_song` keep it in sync.
+    """
+    async with AsyncSessionLocal() as db:
+        if await db.scalar(select(UserSongCount.user_id).limit(1)) is not None:
+            return
+        result = await db.execute(
+            select(Song.user_id, func.count()).where(Song.is_active == True, Song.user_id.isnot(None)).group_by(Song.user_id)
+        )
+        rows = [{"user_id": user_id, "active_songs": count} for user_id, count in result.all()]
+        if rows:
+            await db.execute(upsert(UserSongCount, rows, ["user_id"]))
+            await db.commit()
+            logger.info(f"Backfilled song counts for {len(rows)} users")
@@ -1,9 +1,16 @@
-from sqlalchemy.orm import Session
+from datetime import datetime
+from sqlalchemy import Row, delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from fastapi import HTTPException
 from typing import Optional, Tuple, List
 
 from app.models.table import *
 from app.schemas.user import *
+from app.utils.database import upsert
+
+# UserResponse.from_orm 会访问 user.teams[0].team.studio，异步会话下必须预加载
+USER_LOAD_OPTIONS = (selectinload(User.teams).selectinload(TeamMember.team).selectinload(Team.studio),)
 
 def split_studio_team(dept: str) -> Tuple[str, Optional[str]]:
     if ">" in dept:
@@ -12,108 +19,179 @@ def split_studio_team(dept: str) -> Tuple[str, Optional[str]]:
     else:
         return dept.strip(), None
 
-def get_user(db: Session, user_info: dict) -> Tuple[UserResponse, bool]:
+async def _load_user(db: AsyncSession, *criteria) -> Optional[User]:
+    result = await db.execute(select(User).options(*USER_LOAD_OPTIONS).where(*criteria).execution_options(populate_existing=True))
+    return result.scalars().first()
 
+async def get_user(db: AsyncSession, user_info: dict) -> UserResponse:
     try:
-        name = user_info["alias"]
-        user = db.query(User).filter(User.name == name).first()
         studio_name, team_name = split_studio_team(user_info["dept"])
-        studio = get_or_create_studio(db, studio_name)
-        if team_name is None:
-            team_name = studio_name
-        team = get_or_create_team(db, team_name, studio.id)
-        if user is None:
-            user = User(
-                name=name,
-                job_number=user_info["username"],
-                job_name=user_info["extra"]["job_name"],
-                avatar_url=user_info["extra"]["avatar"],
-            )
-            db.add(user)
-
-            db.commit()
-            if team is not None:
-                team_member = TeamMember(user_id=user.id, team_id=team.id)
-                db.add(team_member)
-        user.token = user_info["token"]
-        user.job_name = user_info["extra"]["job_name"]
-        user.avatar_url = user_info["extra"]["avatar"]
-        db.commit()
-
-        db.refresh(user)
-        user_response = UserResponse.from_orm(user)
-        return user_response
-
+        # 部门没有二级工作室时，以一级项目组作为团队
+        return await upsert_login(db, user_info, team_name or studio_name)
     except Exception as e:
+        await db.rollback()
         print(e)
         raise HTTPException(status_code=500, detail="Failed to get or create user")
 
-def get_or_create_studio(db: Session, studio_name: str) -> Studio:
-    studio = db.query(Studio).filter(Studio.name == studio_name).first()
-    if studio is None:
-        studio = Studio(name=studio_name)
-        db.add(studio)
-        db.flush()
-    return studio
+async def upsert_login(db: AsyncSession, user_info: dict, team_name: Optional[str]) -> UserResponse:
+    """
+    Create or refresh the user, studio, team and membership for one OA login
+    in a single transaction. Every write is an INSERT ... ON CONFLICT, so two
+    concurrent first logins of the same user converge on the same rows. A
+    login that names a team replaces the user's previous membership.
+    """
+    studio_name, _ = split_studio_team(user_info["dept"])
+    studio = await get_or_create_studio(db, studio_name)
+    team = await get_or_create_team(db, team_name, studio.id)
+    user = (await db.execute(
+        upsert(
+            User,
+            {
+                "name": user_info["alias"],
+                "job_number": user_info["username"],
+                "job_name": user_info["extra"]["job_name"],
+                "avatar_url": user_info["extra"]["avatar"],
+                "token": user_info["token"],
+                "created_at": datetime.now(),
+                "is_active": True,
+                "power": 0,
+            },
+            ["job_number"],
+            lambda excluded: {
+                "name": excluded.name,
+                "job_name": excluded.job_name,
+                "avatar_url": excluded.avatar_url,
+                "token": excluded.token,
+            },
+        ).returning(User.id, User.name, User.job_name, User.job_number, User.avatar_url, User.is_active, User.power)
+    )).one()
+    if team is not None:
+        # 团队变更时替换原有归属，而不是追加
+        await db.execute(delete(TeamMember).where(TeamMember.user_id == user.id, TeamMember.team_id != team.id))
+        await db.execute(upsert(TeamMember, {"user_id": user.id, "team_id": team.id}, ["user_id", "team_id"]))
+    await db.commit()
 
-def get_or_create_team(db: Session, team_name: Optional[str], studio_id: int) -> Optional[Team]:
+    if team is None:
+        # 没有团队信息时沿用已有的团队归属
+        return UserResponse.from_orm(await _load_user(db, User.id == user.id))
+    return UserResponse(
+        id=user.id,
+        name=user.name,
+        job_name=user.job_name,
+        job_number=user.job_number,
+        avatar_url=user.avatar_url,
+        is_active=user.is_active,
+        power=user.power or 0,
+        studio=StudioResponse(id=studio.id, name=studio.name),
+        team=TeamResponse(id=team.id, name=team.name),
+    )
+
+async def get_or_create_studio(db: AsyncSession, studio_name: str) -> Row:
+    # DO UPDATE 而非 DO NOTHING，冲突时 RETURNING 仍能返回已有行
+    stmt = upsert(Studio, {"name": studio_name, "is_active": True}, ["name"], lambda excluded: {"name": excluded.name})
+    return (await db.execute(stmt.returning(Studio.id, Studio.name))).one()
+
+async def get_or_create_team(db: AsyncSession, team_name: Optional[str], studio_id: int) -> Optional[Row]:
     if team_name is None:
         return None
-    team = db.query(Team).filter(Team.name == team_name, Team.studio_id == studio_id).first()
-    if team is None:
-        team = Team(name=team_name, studio_id=studio_id)
-        db.add(team)
-    return team
+    stmt = upsert(Team, {"name": team_name, "studio_id": studio_id, "is_active": True}, ["studio_id", "name"], lambda excluded: {"name": excluded.name})
+    return (await db.execute(stmt.returning(Team.id, Team.name))).one()
 
-def create_or_update_user(db: Session, user_info: dict) -> UserResponse:
+async def create_or_update_user(db: AsyncSession, user_info: dict) -> UserResponse:
     try:
-        name = user_info["alias"]
-        user = db.query(User).filter(User.name == name).first()
-        if user is None:
-            user = User(
-                name=name,
-                job_number=user_info["username"],
-                job_name=user_info["extra"]["job_name"],
-                avatar_url=user_info["extra"]["avatar"],
-                token=user_info["token"],
-            )
-            db.add(user)
-        else:
-            user.job_name = user_info["extra"]["job_name"]
-            user.avatar_url = user_info["extra"]["avatar"]
-            user.token = user_info["token"]
-
-        studio_name, team_name = split_studio_team(user_info["dept"])
-        studio = get_or_create_studio(db, studio_name)
-        team = get_or_create_team(db, team_name, studio.id)
-        db.commit()
-
-        if team is not None:
-            team_member = db.query(TeamMember).filter(TeamMember.user_id == user.id, TeamMember.team_id == team.id).first()
-            if team_member is None:
-                team_member = TeamMember(user_id=user.id, team_id=team.id)
-                db.add(team_member)
-                db.commit()
-
-        db.refresh(user)
-        return UserResponse.from_orm(user)
-
+        _, team_name = split_studio_team(user_info["dept"])
+        return await upsert_login(db, user_info, team_name)
     except Exception as e:
+        await db.rollback()
         print(e)
         raise HTTPException(status_code=500, detail="Failed to create or update user")
 
-def get_user_by_id(db: Session, user_id: int) -> Optional[UserResponse]:
-    user = db.query(User).filter(User.id == user_id, User.is_active == True).first()
+async def get_user_by_id(db: AsyncSession, user_id: int) -> Optional[UserResponse]:
+    user = await _load_user(db, User.id == user_id, User.is_active == True)
     if user is None:
         return None
     return UserResponse.from_orm(user)
 
-def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[UserResponse]:
-    users = db.query(User).filter(User.is_active == True).offset(skip).limit(limit).all()
-    return [UserResponse.from_orm(user) for user in users]
-
-def update_user(db: Session, user_id: int, user_update: UserUpdate) -> Optional[UserResponse]:
-    user = db.query(User).filter(User.id == user_id).first()
+async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100, name: Optional[str] = None,
+                    studio_id: Optional[int] = None, team_id: Optional[int] = None, is_active: Optional[bool] = True) -> List[UserResponse]:
+    # 团队与工作室通过 selectinload 批量加载，每页查询数与页大小无关
+    query = select(User).options(*USER_LOAD_OPTIONS)
+    if is_active is not None:
+        query = query.where(User.is_active == is_active)
+    if name:
+        query = query.where(User.name.contains(name))
+    if team_id is not None or studio_id is not None:
+        members = select(TeamMember.user_id).join(Team, Team.id == TeamMember.team_id)
+        if team_id is not None:
+            members = members.where(TeamMember.team_id == team_id)
+        if studio_id is not None:
+            members = members.where(Team.studio_id == studio_id)
+        query = query.where(User.id.in_(members))
+    result = await db.execute(query.order_by(User.id).offset(skip).limit(limit))
+    return [UserResponse.from_orm(user) for user in result.scalars().all()]
+
+async def get_teams(db: AsyncSession, skip: int = 0, limit: int = 100, name: Optional[str] = None,
+                    studio_id: Optional[int] = None) -> List[TeamDirectoryResponse]:
+    query = select(Team).options(selectinload(Team.studio)).where(Team.is_active == True)
+    if name:
+        query = query.where(Team.name.contains(name))
+    if studio_id is not None:
+        query = query.where(Team.studio_id == studio_id)
+    teams = (await db.execute(query.order_by(Team.id).offset(skip).limit(limit))).scalars().all()
+    team_ids = [team.id for team in teams]
+
+    # 成员数与歌曲数各用一条分组查询，只统计本页的团队
+    member_counts = dict((await db.execute(
+        select(TeamMember.team_id, func.count()).where(TeamMember.team_id.in_(team_ids)).group_by(TeamMember.team_id)
+    )).all()) if team_ids else {}
+    song_counts = dict((await db.execute(
+        select(Song.team_id, func.count()).where(Song.team_id.in_(team_ids), Song.is_active == True).group_by(Song.team_id)
+    )).all()) if team_ids else {}
+    return [
+        TeamDirectoryResponse(
+            id=team.id,
+            name=team.name,
+            studio=StudioResponse.from_orm(team.studio) if team.studio else None,
+            member_count=member_counts.get(team.id, 0),
+            song_count=song_counts.get(team.id, 0),
+        )
+        for team in teams
+    ]
+
+async def get_studios(db: AsyncSession, skip: int = 0, limit: int = 100, name: Optional[str] = None) -> List[StudioDirectoryResponse]:
+    query = select(Studio).where(Studio.is_active == True)
+    if name:
+        query = query.where(Studio.name.contains(name))
+    studios = (await db.execute(query.order_by(Studio.id).offset(skip).limit(limit))).scalars().all()
+    studio_ids = [studio.id for studio in studios]
+    if not studio_ids:
+        return []
+
+    team_stats = {
+        studio_id: (team_count, member_count)
+        for studio_id, team_count, member_count in (await db.execute(
+            select(Team.studio_id, func.count(func.distinct(Team.id)), func.count(func.distinct(TeamMember.user_id)))
+            .outerjoin(TeamMember, TeamMember.team_id == Team.id)
+            .where(Team.studio_id.in_(studio_ids), Team.is_active == True)
+            .group_by(Team.studio_id)
+        )).all()
+    }
+    song_counts = dict((await db.execute(
+        select(Song.studio_id, func.count()).where(Song.studio_id.in_(studio_ids), Song.is_active == True).group_by(Song.studio_id)
+    )).all())
+    return [
+        StudioDirectoryResponse(
+            id=studio.id,
+            name=studio.name,
+            team_count=team_stats.get(studio.id, (0, 0))[0],
+            member_count=team_stats.get(studio.id, (0, 0))[1],
+            song_count=song_counts.get(studio.id, 0),
+        )
+        for studio in studios
+    ]
+
+async def update_user(db: AsyncSession, user_id: int, user_update: UserUpdate) -> Optional[UserResponse]:
+    user = await _load_user(db, User.id == user_id)
     if user is None:
         return None
 
@@ -121,16 +199,14 @@ def update_user(db: Session, user_id: int, user_update: UserUpdate) -> Optional[
     for key, value in user_data.items():
         setattr(user, key, value)
 
-    db.commit()
-    db.refresh(user)
+    await db.commit()
     return UserResponse.from_orm(user)
 
-def delete_user(db: Session, user_id: int) -> Optional[User]:
-    user = db.query(User).filter(User.id == user_id).first()
+async def delete_user(db: AsyncSession, user_id: int) -> Optional[User]:
+    user = (await db.execute(select(User).where(User.id == user_id))).scalars().first()
     if user is None:
         return None
 
     user.is_active = False
-    db.commit()
-    db.refresh(user)
-    return user
\ No newline at end of file
+    await db.commit()
+    return user
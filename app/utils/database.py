@@ -1,4 +1,6 @@
+from typing import Callable, Optional, Sequence, Union
 from sqlalchemy import create_engine, DateTime
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from pytz import timezone
@@ -11,11 +13,45 @@ class BeijingDateTime(DateTime):
             return value.astimezone(timezone('Asia/Shanghai'))
         return value
 
+def async_database_url(url: str) -> str:
+    """
+    Map a sync database URL onto its async driver (asyncpg / aiosqlite).
+    """
+    if url.startswith("postgresql://"):
+        return "postgresql+asyncpg://" + url[len("postgresql://"):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
 try:
+    # 同步 engine 仅用于启动时建库建表
     engine = create_engine(config_setting.SQLALCHEMY_DATABASE_URL)
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    async_engine = create_async_engine(async_database_url(config_setting.SQLALCHEMY_DATABASE_URL))
+    AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
     Base = declarative_base()
 except Exception as e:
     print(e)
     exit(1)
 
+def upsert(model, values: Union[dict, Sequence[dict]], index_elements: Sequence[str],
+           set_: Optional[Union[dict, Callable]] = None, where=None):
+    """
+    INSERT ... ON CONFLICT for the configured dialect (PostgreSQL / SQLite).
+
+    `set_` is the update applied on conflict, either a dict or a callable
+    receiving the `excluded` row; without it conflicting rows are left alone.
+    `where` limits which conflicting rows are updated.
+    """
+    if async_engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif async_engine.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"upsert is not supported on {async_engine.dialect.name}")
+    stmt = insert(model).values(values)
+    if set_ is None:
+        return stmt.on_conflict_do_nothing(index_elements=index_elements)
+    if callable(set_):
+        set_ = set_(stmt.excluded)
+    return stmt.on_conflict_do_update(index_elements=index_elements, set_=set_, where=where)
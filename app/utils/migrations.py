@@ -0,0 +1,72 @@
+import os
+from contextlib import contextmanager
+from typing import Iterator
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DatabaseError
+from sqlalchemy_utils import create_database, database_exists
+
+from app.utils.database import engine
+
+try:
+    import fcntl
+except ImportError:  # Windows 下无 fcntl，SQLite 迁移不加锁
+    fcntl = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# create_all 时代建出的表结构对应的迁移版本
+BASELINE_REVISION = "0001"
+# PostgreSQL advisory lock 的键，所有 worker 共用
+MIGRATION_LOCK_ID = 727_001
+
+def alembic_config() -> Config:
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT, "migrations"))
+    config.attributes["configure_logger"] = False
+    return config
+
+@contextmanager
+def migration_lock() -> Iterator[None]:
+    """
+    Hold a lock shared by every worker for the duration of a migration run:
+    a session-level advisory lock on PostgreSQL, a lock file next to the
+    database on SQLite.
+    """
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as connection:
+            connection.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+            try:
+                yield
+            finally:
+                connection.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+    elif engine.dialect.name == "sqlite" and engine.url.database not in (None, "", ":memory:") and fcntl is not None:
+        with open(f"{engine.url.database}.migrate.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    else:
+        yield
+
+def run_migrations() -> None:
+    """
+    Create the database if needed and upgrade it to the latest revision.
+    Databases built by the old `create_all` startup have no version table;
+    they are stamped at the baseline first so only later revisions run.
+    Every worker calls this on startup, so the run holds `migration_lock`.
+    """
+    if not database_exists(engine.url):
+        try:
+            create_database(engine.url)
+        except DatabaseError:
+            # 另一个 worker 已抢先建库
+            if not database_exists(engine.url):
+                raise
+    config = alembic_config()
+    with migration_lock():
+        tables = set(inspect(engine).get_table_names())
+        if "alembic_version" not in tables and "users" in tables:
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, "head")
@@ -0,0 +1,90 @@
+"""baseline: schema as created by Base.metadata.create_all before migrations
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String()),
+        sa.Column("job_number", sa.String()),
+        sa.Column("job_name", sa.String()),
+        sa.Column("token", sa.String()),
+        sa.Column("avatar_url", sa.String()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("power", sa.Integer()),
+        sa.Column("is_active", sa.Boolean()),
+    )
+    op.create_index("ix_users_name", "users", ["name"])
+    op.create_index("ix_users_job_number", "users", ["job_number"], unique=True)
+
+    op.create_table(
+        "studios",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String()),
+        sa.Column("is_active", sa.Boolean()),
+    )
+    op.create_index("ix_studios_name", "studios", ["name"])
+
+    op.create_table(
+        "teams",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String()),
+        sa.Column("studio_id", sa.Integer(), sa.ForeignKey("studios.id", ondelete="CASCADE")),
+        sa.Column("is_active", sa.Boolean()),
+    )
+    op.create_index("ix_teams_name", "teams", ["name"])
+
+    op.create_table(
+        "team_members",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("team_id", sa.Integer(), sa.ForeignKey("teams.id", ondelete="CASCADE"), primary_key=True),
+    )
+
+    op.create_table(
+        "songs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE")),
+        sa.Column("studio_id", sa.Integer(), sa.ForeignKey("studios.id", ondelete="CASCADE")),
+        sa.Column("team_id", sa.Integer(), sa.ForeignKey("teams.id", ondelete="CASCADE")),
+        sa.Column("title", sa.String()),
+        sa.Column("image_url", sa.String()),
+        sa.Column("audio_url", sa.String()),
+        sa.Column("video_url", sa.String()),
+        sa.Column("model_name", sa.String()),
+        sa.Column("gpt_description_prompt", sa.Text()),
+        sa.Column("type", sa.String()),
+        sa.Column("prompt", sa.String()),
+        sa.Column("lyrics", sa.Text()),
+        sa.Column("tags", sa.String()),
+        sa.Column("make_instrumental", sa.Boolean()),
+        sa.Column("is_custom", sa.Boolean()),
+        sa.Column("is_public", sa.Boolean()),
+        sa.Column("is_active", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("deleted_at", sa.DateTime()),
+    )
+
+    op.create_table(
+        "logs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("song_id", sa.Integer(), sa.ForeignKey("songs.id", ondelete="CASCADE")),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE")),
+        sa.Column("action", sa.String()),
+        sa.Column("message", sa.String()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+
+def downgrade() -> None:
+    for table in ("logs", "songs", "team_members", "teams", "studios", "users"):
+        op.drop_table(table)
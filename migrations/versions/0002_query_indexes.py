@@ -0,0 +1,32 @@
+"""composite indexes for song list, credits, title lookups and download logs
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # PostgreSQL 上并发建索引，不锁写入；CONCURRENTLY 不能在事务内执行
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_songs_user_active_id", "songs", ["user_id", sa.text("id DESC")],
+            postgresql_where=sa.text("is_active"), sqlite_where=sa.text("is_active"), postgresql_concurrently=True,
+        )
+        op.create_index("ix_songs_user_created", "songs", ["user_id", "created_at"], postgresql_concurrently=True)
+        op.create_index("ix_songs_user_title_id", "songs", ["user_id", "title", "id"], postgresql_concurrently=True)
+        op.create_index("ix_logs_song_created", "logs", ["song_id", "created_at"], postgresql_concurrently=True)
+        op.create_index("ix_team_members_team_id", "team_members", ["team_id"], postgresql_concurrently=True)
+
+def downgrade() -> None:
+    op.drop_index("ix_team_members_team_id", table_name="team_members")
+    op.drop_index("ix_logs_song_created", table_name="logs")
+    op.drop_index("ix_songs_user_title_id", table_name="songs")
+    op.drop_index("ix_songs_user_created", table_name="songs")
+    op.drop_index("ix_songs_user_active_id", table_name="songs")
@@ -0,0 +1,52 @@
+"""unique studios(name) and teams(studio_id, name) for login upserts
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+# 每组重复的工作室 / 团队保留 id 最小的一条，引用改指到保留行后再删除其余行；
+# name 为空的行不受唯一约束影响，保持原样
+KEEP_STUDIO = "(SELECT MIN(keep.id) FROM studios keep JOIN studios cur ON cur.name = keep.name WHERE cur.id = {ref})"
+KEEP_TEAM = "(SELECT MIN(keep.id) FROM teams keep JOIN teams cur ON cur.studio_id = keep.studio_id AND cur.name = keep.name WHERE cur.id = {ref})"
+DUP_STUDIOS = "(SELECT id FROM studios WHERE name IS NOT NULL AND id NOT IN (SELECT MIN(id) FROM studios WHERE name IS NOT NULL GROUP BY name))"
+DUP_TEAMS = (
+    "(SELECT id FROM teams WHERE name IS NOT NULL AND studio_id IS NOT NULL AND id NOT IN "
+    "(SELECT MIN(id) FROM teams WHERE name IS NOT NULL AND studio_id IS NOT NULL GROUP BY studio_id, name))"
+)
+
+DEDUPE = [
+    f"UPDATE teams SET studio_id = {KEEP_STUDIO.format(ref='teams.studio_id')} WHERE studio_id IN {DUP_STUDIOS}",
+    f"UPDATE songs SET studio_id = {KEEP_STUDIO.format(ref='songs.studio_id')} WHERE studio_id IN {DUP_STUDIOS}",
+    f"DELETE FROM studios WHERE id IN {DUP_STUDIOS}",
+    f"""
+    INSERT INTO team_members (user_id, team_id)
+    SELECT DISTINCT tm.user_id, {KEEP_TEAM.format(ref='tm.team_id')}
+    FROM team_members tm
+    WHERE tm.team_id IN {DUP_TEAMS}
+      AND NOT EXISTS (SELECT 1 FROM team_members x WHERE x.user_id = tm.user_id AND x.team_id = {KEEP_TEAM.format(ref='tm.team_id')})
+    """,
+    f"DELETE FROM team_members WHERE team_id IN {DUP_TEAMS}",
+    f"UPDATE songs SET team_id = {KEEP_TEAM.format(ref='songs.team_id')} WHERE team_id IN {DUP_TEAMS}",
+    f"DELETE FROM teams WHERE id IN {DUP_TEAMS}",
+]
+
+def upgrade() -> None:
+    for statement in DEDUPE:
+        op.execute(statement)
+    with op.batch_alter_table("studios") as batch:
+        batch.create_unique_constraint("uq_studios_name", ["name"])
+    with op.batch_alter_table("teams") as batch:
+        batch.create_unique_constraint("uq_teams_studio_name", ["studio_id", "name"])
+
+def downgrade() -> None:
+    with op.batch_alter_table("teams") as batch:
+        batch.drop_constraint("uq_teams_studio_name", type_="unique")
+    with op.batch_alter_table("studios") as batch:
+        batch.drop_constraint("uq_studios_name", type_="unique")
@@ -0,0 +1,32 @@
+"""usage rollups by day, studio and team
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        "usage_daily",
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("studio_id", sa.Integer(), primary_key=True),
+        sa.Column("team_id", sa.Integer(), primary_key=True),
+        sa.Column("songs", sa.Integer(), nullable=False),
+        sa.Column("downloads", sa.Integer(), nullable=False),
+    )
+    op.create_table(
+        "rollup_watermarks",
+        sa.Column("name", sa.String(), primary_key=True),
+        sa.Column("last_id", sa.Integer(), nullable=False),
+    )
+
+def downgrade() -> None:
+    op.drop_table("rollup_watermarks")
+    op.drop_table("usage_daily")
@@ -0,0 +1,116 @@
+"""song media columns, generation jobs, media objects, song counts and quotas
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+Databases that ran a `create_all` build between the baseline and the
+introduction of migrations may already have some of these tables (create_all
+adds missing tables, never columns), so each schema step checks first.
+Existing songs are marked "ready" (their media are flat legacy files) and get
+their clip_id back from the legacy cover file name.
+"""
+import os
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+SONG_COLUMNS = [
+    ("clip_id", True),
+    ("source_image_url", False),
+    ("source_audio_url", False),
+    ("media_status", False),
+    ("image_key", True),
+    ("audio_key", True),
+]
+BACKFILL_BATCH = 1000
+
+def backfill_clip_ids(bind) -> None:
+    # 旧版封面文件名取自上游 image_<clip_id>.<ext>，由 image_url 的文件名还原 clip_id
+    songs = sa.table("songs", sa.column("id"), sa.column("image_url"), sa.column("clip_id"))
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(songs.c.id, songs.c.image_url)
+            .where(songs.c.id > last_id, songs.c.clip_id.is_(None), songs.c.image_url.like("/api/get_file/images/%"))
+            .order_by(songs.c.id).limit(BACKFILL_BATCH)
+        ).all()
+        if not rows:
+            return
+        bind.execute(
+            sa.update(songs).where(songs.c.id == sa.bindparam("song_id")).values(clip_id=sa.bindparam("clip")),
+            [{"song_id": song_id, "clip": os.path.splitext(image_url.rsplit("/", 1)[-1])[0]} for song_id, image_url in rows],
+        )
+        last_id = rows[-1].id
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+    existing = {column["name"] for column in inspector.get_columns("songs")}
+
+    for name, indexed in SONG_COLUMNS:
+        if name in existing:
+            continue
+        op.add_column("songs", sa.Column(name, sa.String()))
+        if indexed:
+            op.create_index(f"ix_songs_{name}", "songs", [name])
+    # 旧歌曲的媒体是 MEDIA_ROOT 下的平铺文件，不需要后台入库
+    op.execute("UPDATE songs SET media_status = 'ready' WHERE media_status IS NULL")
+    backfill_clip_ids(bind)
+
+    if "user_song_counts" not in tables:
+        op.create_table(
+            "user_song_counts",
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("active_songs", sa.Integer(), nullable=False),
+        )
+
+    if "daily_quotas" not in tables:
+        op.create_table(
+            "daily_quotas",
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("day", sa.Date(), primary_key=True),
+            sa.Column("used", sa.Integer(), nullable=False),
+        )
+
+    if "media_objects" not in tables:
+        op.create_table(
+            "media_objects",
+            sa.Column("key", sa.String(), primary_key=True),
+            sa.Column("kind", sa.String()),
+            sa.Column("size", sa.Integer()),
+            sa.Column("refcount", sa.Integer()),
+            sa.Column("created_at", sa.DateTime()),
+        )
+
+    if "generation_jobs" not in tables:
+        op.create_table(
+            "generation_jobs",
+            sa.Column("id", sa.String(32), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE")),
+            sa.Column("account", sa.String(12)),
+            sa.Column("kind", sa.String()),
+            sa.Column("title", sa.String()),
+            sa.Column("clip_ids", sa.String()),
+            sa.Column("song_ids", sa.String()),
+            sa.Column("status", sa.String()),
+            sa.Column("error", sa.String()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+        )
+        op.create_index("ix_generation_jobs_user_id", "generation_jobs", ["user_id"])
+        op.create_index("ix_generation_jobs_status", "generation_jobs", ["status"])
+
+def downgrade() -> None:
+    for table in ("generation_jobs", "media_objects", "daily_quotas", "user_song_counts"):
+        op.drop_table(table)
+    for name, indexed in reversed(SONG_COLUMNS):
+        if indexed:
+            op.drop_index(f"ix_songs_{name}", table_name="songs")
+        with op.batch_alter_table("songs") as batch:
+            batch.drop_column(name)
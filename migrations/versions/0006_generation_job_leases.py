@@ -0,0 +1,22 @@
+"""owner and lease for running generation jobs
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column("generation_jobs", sa.Column("owner", sa.String()))
+    op.add_column("generation_jobs", sa.Column("lease_until", sa.DateTime()))
+
+def downgrade() -> None:
+    with op.batch_alter_table("generation_jobs") as batch:
+        batch.drop_column("lease_until")
+        batch.drop_column("owner")
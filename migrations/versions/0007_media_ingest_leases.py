@@ -0,0 +1,31 @@
+"""owner and lease for songs whose media is being ingested
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+UNFINISHED = sa.text("media_status IN ('pending', 'ingesting')")
+
+def upgrade() -> None:
+    op.add_column("songs", sa.Column("media_owner", sa.String()))
+    op.add_column("songs", sa.Column("media_lease_until", sa.DateTime()))
+    # 后台定期扫描未完成入库的歌曲，只索引这部分行
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_songs_media_unfinished", "songs", ["media_status"],
+            postgresql_where=UNFINISHED, sqlite_where=UNFINISHED, postgresql_concurrently=True,
+        )
+
+def downgrade() -> None:
+    op.drop_index("ix_songs_media_unfinished", table_name="songs")
+    with op.batch_alter_table("songs") as batch:
+        batch.drop_column("media_lease_until")
+        batch.drop_column("media_owner")
@@ -0,0 +1,25 @@
+"""index unreferenced media objects for garbage collection
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+UNREFERENCED = sa.text("refcount = 0")
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_media_objects_unreferenced", "media_objects", ["key"],
+            postgresql_where=UNREFERENCED, sqlite_where=UNREFERENCED, postgresql_concurrently=True,
+        )
+
+def downgrade() -> None:
+    op.drop_index("ix_media_objects_unreferenced", table_name="media_objects")
@@ -0,0 +1,23 @@
+"""index songs.audio_url for legacy download attribution
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18
+
+Audio files saved before clip ids were stored are named after the upstream
+URL rather than the clip id, so their downloads are matched on audio_url.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index("ix_songs_audio_url", "songs", ["audio_url"], postgresql_concurrently=True)
+
+def downgrade() -> None:
+    op.drop_index("ix_songs_audio_url", table_name="songs")
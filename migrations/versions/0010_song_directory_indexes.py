@@ -0,0 +1,31 @@
+"""partial indexes for the admin directory's active song counts
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+ACTIVE = sa.text("is_active")
+
+def upgrade() -> None:
+    # /admin/teams 与 /admin/studios 按当前页的 id 统计有效歌曲数，只索引有效行
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_songs_team_active", "songs", ["team_id"],
+            postgresql_where=ACTIVE, sqlite_where=ACTIVE, postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_songs_studio_active", "songs", ["studio_id"],
+            postgresql_where=ACTIVE, sqlite_where=ACTIVE, postgresql_concurrently=True,
+        )
+
+def downgrade() -> None:
+    op.drop_index("ix_songs_studio_active", table_name="songs")
+    op.drop_index("ix_songs_team_active", table_name="songs")
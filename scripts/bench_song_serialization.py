@@ -0,0 +1,113 @@
+"""
+Serialization benchmark for /song_list and /song_info.
+
+Seeds the database named by DATABASE_URL (must be an empty scratch
+database; SQLite works) with one user's songs, each carrying long lyrics
+and prompts, then times building the response body two ways at 50 and 500
+songs per page:
+
+  entity  select(Song) -> SongResponse.from_orm -> SongListResponse ->
+          response_model validation -> model_dump_json (the old path)
+  lean    SongService column select -> plain dicts -> json_dumps
+
+and prints the cost per song of each. Logging is switched off while timing
+(both paths log the same line per call), and the single-row song_info
+call runs more rounds so the comparison is not lost in noise.
+
+    DATABASE_URL=sqlite:///./serialization_bench.db python -m scripts.bench_song_serialization
+"""
+import asyncio, sys, time
+from datetime import datetime
+from typing import Awaitable, Callable
+
+from sqlalchemy import func, insert, select
+
+from app.lib.utils import json_dumps, logger, orjson
+from app.models.table import Song, User, UserSongCount
+from app.schemas.song import SongInfoRequest, SongInfoResponse, SongListRequest, SongListResponse, SongResponse
+from app.services.song_service import SongService
+from app.services.user_service import get_user_by_id
+from app.utils.database import AsyncSessionLocal, async_engine
+from app.utils.migrations import run_migrations
+
+SONGS = 2000
+PAGE_SIZES = (50, 500)
+ROUNDS = 20
+INFO_ROUNDS = 500
+LYRICS = "\n".join(f"[Verse {n}] la la la la la la la la la la la la" for n in range(60))
+
+async def seed() -> None:
+    async with AsyncSessionLocal() as db:
+        if await db.scalar(select(func.count()).select_from(User)):
+            sys.exit("Refusing to seed a non-empty database; point DATABASE_URL at a scratch database")
+        now = datetime.now()
+        await db.execute(insert(User), [{"id": 1, "name": "bench", "job_number": "E1", "is_active": True, "power": 0, "created_at": now}])
+        await db.execute(insert(Song), [
+            {
+                "user_id": 1, "title": f"song {n}", "tags": "pop, upbeat, 120bpm", "make_instrumental": False,
+                "image_url": f"/api/get_file/images/clip-{n}.jpeg", "audio_url": f"/api/get_file/audios/clip-{n}.mp3",
+                "prompt": LYRICS, "gpt_description_prompt": "an upbeat pop song about benchmarks",
+                "lyrics": LYRICS, "is_active": True, "created_at": now,
+            }
+            for n in range(SONGS)
+        ])
+        await db.execute(insert(UserSongCount), [{"user_id": 1, "active_songs": SONGS}])
+        await db.commit()
+
+async def timed(call: Callable[[], Awaitable[str]], rounds: int = ROUNDS) -> float:
+    call_result = await call()  # 预热，并确保结果非空
+    assert call_result
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await call()
+    return (time.perf_counter() - start) / rounds
+
+async def main() -> int:
+    await asyncio.to_thread(run_migrations)
+    await seed()
+    # 只比较序列化：日志输出的耗时与之无关，且会淹没单条 song_info 的差异
+    logger.disabled = True
+    service = SongService()
+    print(f"encoder: {'orjson' if orjson is not None else 'json'}")
+    async with AsyncSessionLocal() as db:
+        user = await get_user_by_id(db, 1)
+
+        for page_size in PAGE_SIZES:
+            request = SongListRequest(pageSize=page_size)
+
+            async def entity_list() -> str:
+                songs = (await db.execute(
+                    select(Song).where(Song.user_id == user.id, Song.is_active == True).order_by(Song.id.desc()).limit(page_size)
+                )).scalars().all()
+                response = SongListResponse(songsList=[SongResponse.from_orm(song) for song in songs], total=SONGS)
+                return SongListResponse.model_validate(response.model_dump()).model_dump_json()
+
+            async def lean_list() -> str:
+                return json_dumps(await service.get_song_list(db, request, user))
+
+            entity = await timed(entity_list)
+            lean = await timed(lean_list)
+            print(
+                f"song_list pageSize={page_size:<4} entity={entity / page_size * 1e6:7.1f} us/song "
+                f"lean={lean / page_size * 1e6:7.1f} us/song ({entity / lean:.1f}x)"
+            )
+            db.expunge_all()
+
+        song_id = await db.scalar(select(func.max(Song.id)))
+        info_request = SongInfoRequest(id=song_id)
+
+        async def entity_info() -> str:
+            song = (await db.execute(select(Song).where(Song.id == song_id, Song.user_id == user.id))).scalars().first()
+            return SongInfoResponse.model_validate(SongInfoResponse.from_orm(song).model_dump()).model_dump_json()
+
+        async def lean_info() -> str:
+            return json_dumps(await service.get_song_info(db, info_request, user))
+
+        entity = await timed(entity_info, INFO_ROUNDS)
+        lean = await timed(lean_info, INFO_ROUNDS)
+        print(f"song_info                entity={entity * 1e6:7.1f} us      lean={lean * 1e6:7.1f} us      ({entity / lean:.1f}x)")
+    await async_engine.dispose()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,94 @@
+"""
+Query-count benchmark for the admin directory.
+
+Seeds the database named by DATABASE_URL (must be an empty scratch
+database; SQLite works) with studios, teams, members and songs, then calls
+the directory services at several page sizes while counting the SQL
+statements each call issues. Exits 1 if the count for any endpoint grows
+with the page size, i.e. if something is loaded per row.
+
+    DATABASE_URL=sqlite:///./directory_bench.db python -m scripts.directory_query_count
+"""
+import asyncio, sys, time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List
+
+from sqlalchemy import event, insert, select, func
+
+from app.models.table import Song, Studio, Team, TeamMember, User
+from app.services.user_service import get_studios, get_teams, get_users
+from app.utils.database import AsyncSessionLocal, async_engine
+from app.utils.migrations import run_migrations
+
+STUDIOS = 20
+TEAMS_PER_STUDIO = 10
+USERS = 2000
+SONGS_PER_USER = 5
+PAGE_SIZES = (10, 50, 200)
+
+async def seed() -> None:
+    async with AsyncSessionLocal() as db:
+        if await db.scalar(select(func.count()).select_from(User)):
+            sys.exit("Refusing to seed a non-empty database; point DATABASE_URL at a scratch database")
+        now = datetime.now()
+        await db.execute(insert(Studio), [{"id": s, "name": f"studio {s}", "is_active": True} for s in range(1, STUDIOS + 1)])
+        teams = [
+            {"id": (s - 1) * TEAMS_PER_STUDIO + t, "name": f"team {t}", "studio_id": s, "is_active": True}
+            for s in range(1, STUDIOS + 1) for t in range(1, TEAMS_PER_STUDIO + 1)
+        ]
+        await db.execute(insert(Team), teams)
+        await db.execute(insert(User), [
+            {"id": u, "name": f"user {u}", "job_number": f"E{u}", "is_active": True, "power": 0, "created_at": now}
+            for u in range(1, USERS + 1)
+        ])
+        await db.execute(insert(TeamMember), [{"user_id": u, "team_id": teams[u % len(teams)]["id"]} for u in range(1, USERS + 1)])
+        await db.execute(insert(Song), [
+            {
+                "user_id": u, "team_id": teams[u % len(teams)]["id"], "studio_id": teams[u % len(teams)]["studio_id"],
+                "title": f"song {u}-{n}", "is_active": True, "created_at": now,
+            }
+            for u in range(1, USERS + 1) for n in range(SONGS_PER_USER)
+        ])
+        await db.commit()
+
+async def count_queries(call: Callable[[], Awaitable[List]]) -> Dict[str, float]:
+    statements = 0
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        nonlocal statements
+        statements += 1
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        start = time.perf_counter()
+        rows = await call()
+        elapsed = time.perf_counter() - start
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    return {"rows": len(rows), "queries": statements, "ms": elapsed * 1000}
+
+async def main() -> int:
+    await asyncio.to_thread(run_migrations)
+    await seed()
+    endpoints = {
+        "users": lambda db, limit: get_users(db, 0, limit),
+        "users?studio_id": lambda db, limit: get_users(db, 0, limit, studio_id=1),
+        "teams": lambda db, limit: get_teams(db, 0, limit),
+        "studios": lambda db, limit: get_studios(db, 0, limit),
+    }
+    failed = False
+    for name, endpoint in endpoints.items():
+        counts = set()
+        for limit in PAGE_SIZES:
+            async with AsyncSessionLocal() as db:
+                result = await count_queries(lambda: endpoint(db, limit))
+            counts.add(result["queries"])
+            print(f"{name:<16} limit={limit:<4} rows={result['rows']:<4} queries={result['queries']:<3} {result['ms']:.1f} ms")
+        if len(counts) > 1:
+            print(f"FAIL: {name} query count depends on page size: {sorted(counts)}")
+            failed = True
+    await async_engine.dispose()
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
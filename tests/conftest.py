@@ -0,0 +1,17 @@
+import pytest
+
+from app.lib import cache
+
+@pytest.fixture
+def redis_cache(monkeypatch):
+    """
+    Factory for RedisCache instances backed by one in-process fakeredis
+    server, standing in for several workers sharing a Redis.
+    """
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(cache.aioredis, "from_url", lambda url, **kwargs: fakeredis.FakeAsyncRedis(server=server, **kwargs))
+
+    def make(prefix: str = "") -> cache.RedisCache:
+        return cache.RedisCache("redis://fake", prefix)
+    return make
@@ -0,0 +1,54 @@
+import asyncio
+import pytest
+from pydantic import BaseModel
+
+from app.lib import response_cache as response_cache_module
+from app.lib.response_cache import ResponseCache, create_response_cache
+
+class Params(BaseModel):
+    page: int = 1
+
+def test_invalidation_reaches_other_workers(redis_cache):
+    async def scenario():
+        worker_a = ResponseCache(redis_cache("response:"))
+        worker_b = ResponseCache(redis_cache("response:"))
+        loads = []
+
+        async def loader():
+            loads.append(1)
+            return {"songs": len(loads)}
+
+        assert await worker_b.fetch(7, "song_list", Params(), loader) == '{"songs":1}'
+        assert await worker_b.fetch(7, "song_list", Params(), loader) == '{"songs":1}'
+        # 写入发生在 worker A，worker B 的缓存随版本号一起失效
+        await worker_a.invalidate(7)
+        assert await worker_b.fetch(7, "song_list", Params(), loader) == '{"songs":2}'
+        # 其他用户不受影响
+        assert await worker_b.fetch(8, "song_list", Params(), loader) == '{"songs":3}'
+        assert await worker_a.fetch(8, "song_list", Params(), loader) == '{"songs":3}'
+
+    asyncio.run(scenario())
+
+def test_missing_results_are_not_cached(redis_cache):
+    async def scenario():
+        responses = ResponseCache(redis_cache("response:"))
+        loads = []
+
+        async def loader():
+            loads.append(1)
+            return None
+
+        assert await responses.fetch(7, "song_info", Params(), loader) is None
+        assert await responses.fetch(7, "song_info", Params(), loader) is None
+        assert len(loads) == 2
+
+    asyncio.run(scenario())
+
+def test_memory_backend_refused_with_several_workers(monkeypatch):
+    monkeypatch.setattr(response_cache_module.Setting, "RESPONSE_CACHE_BACKEND", "memory")
+    monkeypatch.setattr(response_cache_module.Setting, "WORKERS", 4)
+    with pytest.raises(RuntimeError):
+        create_response_cache()
+
+    monkeypatch.setattr(response_cache_module.Setting, "WORKERS", 1)
+    assert isinstance(create_response_cache(), ResponseCache)
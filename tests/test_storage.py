@@ -0,0 +1,76 @@
+import asyncio, hashlib
+import pytest
+
+from app.lib import storage as storage_module
+from app.lib.storage import LocalStorage, S3Storage, object_name
+
+KEY = hashlib.sha256(b"audio bytes").hexdigest() + ".mp3"
+
+async def stage(backend, data: bytes) -> str:
+    upload = await backend.open_upload()
+    await upload.write(data)
+    await upload.complete()
+    return upload.name
+
+@pytest.fixture
+def s3(monkeypatch):
+    moto = pytest.importorskip("moto")
+    boto3 = pytest.importorskip("boto3")
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        monkeypatch.setenv(name, "testing")
+    monkeypatch.setattr(storage_module.Setting, "S3_ENDPOINT_URL", "")
+    monkeypatch.setattr(storage_module.Setting, "S3_ACCESS_KEY", "testing")
+    monkeypatch.setattr(storage_module.Setting, "S3_SECRET_KEY", "testing")
+    monkeypatch.setattr(storage_module.Setting, "S3_REGION", "us-east-1")
+    monkeypatch.setattr(storage_module.Setting, "S3_BUCKET", "media-test")
+    monkeypatch.setattr(storage_module.Setting, "S3_PART_SIZE", 5 * 1024 * 1024)
+    with moto.mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="media-test")
+        yield S3Storage()
+
+def test_s3_locate_only_answers_for_stored_objects(s3):
+    async def scenario():
+        assert await s3.locate("audios", KEY) == (None, None)
+        await s3.commit(await stage(s3, b"audio bytes"), "audios", KEY)
+        path, url = await s3.locate("audios", KEY)
+        assert path is None and object_name("audios", KEY) in url
+        await s3.delete("audios", KEY)
+        assert await s3.locate("audios", KEY) == (None, None)
+
+    asyncio.run(scenario())
+
+def test_s3_commit_keeps_one_copy_and_drops_the_staged_object(s3):
+    async def scenario():
+        first, second = await stage(s3, b"audio bytes"), await stage(s3, b"audio bytes")
+        await s3.commit(first, "audios", KEY)
+        await s3.commit(second, "audios", KEY)
+        listed = s3.client.list_objects_v2(Bucket=s3.bucket)["Contents"]
+        assert [entry["Key"] for entry in listed] == [object_name("audios", KEY)]
+
+    asyncio.run(scenario())
+
+def test_s3_multipart_upload(s3):
+    data = b"x" * storage_module.Setting.S3_PART_SIZE + b"tail"
+    key = hashlib.sha256(data).hexdigest() + ".mp3"
+
+    async def scenario():
+        await s3.commit(await stage(s3, data), "audios", key)
+        body = s3.client.get_object(Bucket=s3.bucket, Key=object_name("audios", key))["Body"].read()
+        assert body == data
+
+    asyncio.run(scenario())
+
+def test_local_locate_commit_and_delete(tmp_path):
+    backend = LocalStorage(str(tmp_path))
+
+    async def scenario():
+        assert await backend.locate("audios", KEY) == (None, None)
+        await backend.commit(await stage(backend, b"audio bytes"), "audios", KEY)
+        await backend.commit(await stage(backend, b"audio bytes"), "audios", KEY)
+        path, url = await backend.locate("audios", KEY)
+        assert url is None and open(path, "rb").read() == b"audio bytes"
+        assert list((tmp_path / "tmp").iterdir()) == []
+        await backend.delete("audios", KEY)
+        assert await backend.locate("audios", KEY) == (None, None)
+
+    asyncio.run(scenario())
@@ -0,0 +1,73 @@
+import asyncio, hashlib
+
+from app.lib import token_cache as token_cache_module
+from app.lib.token_cache import TokenCache
+from app.schemas.user import UserResponse
+
+USER = UserResponse(id=1, name="user", job_number="E1", is_active=True)
+
+def lock_key(token: str) -> str:
+    return f"token-lock:{hashlib.sha256(token.encode()).hexdigest()}"
+
+def test_one_validation_across_workers(redis_cache):
+    async def scenario():
+        shared = redis_cache("auth:")
+        workers = [TokenCache(redis_cache("auth:")) for _ in range(3)]
+        calls = []
+
+        async def validate():
+            calls.append(1)
+            await asyncio.sleep(0.2)
+            return USER
+
+        users = await asyncio.gather(*(worker.get_user("token", validate) for worker in workers))
+        assert [user.id for user in users] == [1, 1, 1]
+        assert len(calls) == 1
+        # 持锁者验证完成后释放自己的锁
+        assert await shared.get(lock_key("token")) is None
+
+    asyncio.run(scenario())
+
+def test_waiter_does_not_release_the_holders_lock(redis_cache, monkeypatch):
+    monkeypatch.setattr(token_cache_module.Setting, "TOKEN_LOCK_TTL", 0.2)
+
+    async def scenario():
+        shared = redis_cache("auth:")
+        # 另一个 worker 持有锁但迟迟没有写入结果
+        await shared.add(lock_key("token"), "other-worker", 10)
+
+        async def validate():
+            return USER
+
+        assert (await TokenCache(redis_cache("auth:")).get_user("token", validate)).id == 1
+        assert await shared.get(lock_key("token")) == "other-worker"
+
+    asyncio.run(scenario())
+
+def test_expired_lock_taken_by_another_worker_is_kept(redis_cache, monkeypatch):
+    monkeypatch.setattr(token_cache_module.Setting, "TOKEN_LOCK_TTL", 0.1)
+
+    async def scenario():
+        shared = redis_cache("auth:")
+
+        async def validate():
+            # 本 worker 的锁已过期，另一个 worker 重新持有
+            await asyncio.sleep(0.2)
+            assert await shared.add(lock_key("token"), "other-worker", 10)
+            return USER
+
+        assert (await TokenCache(redis_cache("auth:")).get_user("token", validate)).id == 1
+        assert await shared.get(lock_key("token")) == "other-worker"
+
+    asyncio.run(scenario())
+
+def test_delete_if_compares_the_value(redis_cache):
+    async def scenario():
+        shared = redis_cache()
+        await shared.set("lock", "mine", 10)
+        assert not await shared.delete_if("lock", "theirs")
+        assert await shared.get("lock") == "mine"
+        assert await shared.delete_if("lock", "mine")
+        assert await shared.get("lock") is None
+
+    asyncio.run(scenario())